@@ -1,8 +1,17 @@
+import base64
 import math
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
 
-from dash import Dash, dcc, html, Input, Output
+from dash import Dash, dcc, html, Input, Output, Patch, ctx
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.colors import get_colorscale
+from plotly.subplots import make_subplots
 import numpy as np
 import pandas as pd
 import dash_bootstrap_components as dbc
@@ -11,6 +20,10 @@ from sklearn.datasets import make_blobs
 # New: Density heatmap (2 columns) as third plot on tab 2
 # with color and resolution options
 # New: Everything with inline style and bootstrap (no CSS)
+# New: Grid index for the zoom selection of plot 3 (no full scan per zoom)
+# New: The callbacks of one zoom share the selection (computed once per rectangle)
+# New: Plot 3 is rendered as an image on the server when the viewport holds many points
+# New: Plot 5 is summed from a precomputed fine histogram, a color change only restyles it
 
 app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 
@@ -25,14 +38,156 @@ df = pd.DataFrame({'y': np.random.normal(loc=0, scale=10, size=1000),
 # define cluster colors
 
 COLORS = {'0': "red", '1': "blue", '2': "grey"}
+RGB = {"red": (255, 0, 0), "blue": (0, 0, 255), "grey": (128, 128, 128)}
 
-# generic cluster data (for plot 3 and 4)
+# generic cluster data (for plot 3 and 4), more points with CLUSTER_POINTS (benchmarks)
 
-X, y = make_blobs(n_samples=7500, centers=3, n_features=2, random_state=0, cluster_std=0.75)
+X, y = make_blobs(n_samples=int(os.environ.get('CLUSTER_POINTS', 7500)), centers=3, n_features=2, random_state=0, cluster_std=0.75)
 
 cluster_df = pd.DataFrame(data=X, columns=["X", "Y"])
 cluster_df['cluster'] = [str(i) for i in y]
 
+CLUSTERS = ["0", "1", "2"]
+# cluster of every point as index into CLUSTERS and the color of every cluster (for the image)
+cluster_code = np.asarray(y)
+CLUSTER_RGB = np.array([RGB[COLORS[c]] for c in CLUSTERS])
+
+# plot 3 shows markers up to MARKER_LIMIT points in the viewport, above that an image
+# of RASTER_SIZE pixels (width, height) rendered on the server
+MARKER_LIMIT = int(os.environ.get('CLUSTER_MARKER_LIMIT', 20000))
+RASTER_SIZE = (480, 300)
+
+
+class GridIndex:
+    # the points sorted into a regular grid over X/Y, the points of a cell are stored
+    # one after another. A rectangle takes the cells that are completely inside as a whole
+    # (counts from summed-area tables per cluster) and only checks the points of its border cells.
+    def __init__(self, x, y, labels, cells=None):
+        self.x, self.y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        self.labels = np.asarray(labels)
+        n = len(self.x)
+        # about 16 points per cell
+        self.cells = cells or max(1, min(1024, int(math.sqrt(n / 16))))
+        self.x0, self.y0 = self.x.min(), self.y.min()
+        self.width = (self.x.max() - self.x0) / self.cells or 1.0
+        self.height = (self.y.max() - self.y0) / self.cells or 1.0
+
+        cell = self.cell_y(self.y) * self.cells + self.cell_x(self.x)
+        # int32 positions: the selections built from them are kept in the selection cache
+        self.order = np.argsort(cell, kind='stable').astype(np.int32)
+        self.start = np.concatenate([[0], np.cumsum(np.bincount(cell, minlength=self.cells ** 2))])
+
+        # summed-area table per cluster: sat[c][j, i] = points of cluster c in the cells below row j and left of column i
+        self.clusters = sorted(set(self.labels.tolist()))
+        self.sat = {}
+        for c in self.clusters:
+            counts = np.bincount(cell[self.labels == c], minlength=self.cells ** 2).reshape(self.cells, self.cells)
+            self.sat[c] = np.pad(counts.cumsum(axis=0).cumsum(axis=1), ((1, 0), (1, 0)))
+
+    def cell_x(self, x):
+        return np.clip(np.floor((x - self.x0) / self.width), 0, self.cells - 1).astype(int)
+
+    def cell_y(self, y):
+        return np.clip(np.floor((y - self.y0) / self.height), 0, self.cells - 1).astype(int)
+
+    def cell_range(self, rect):
+        # cells touched by the rectangle and the ones completely inside it
+        x_min, x_max, y_min, y_max = rect
+        i0, i1 = self.cell_x(np.array([x_min, x_max]))
+        j0, j1 = self.cell_y(np.array([y_min, y_max]))
+        # inner cells: not cut by an edge of the rectangle
+        a0 = i0 if x_min <= self.x0 + i0 * self.width else i0 + 1
+        a1 = i1 if x_max >= self.x0 + (i1 + 1) * self.width else i1 - 1
+        b0 = j0 if y_min <= self.y0 + j0 * self.height else j0 + 1
+        b1 = j1 if y_max >= self.y0 + (j1 + 1) * self.height else j1 - 1
+        return (i0, i1, j0, j1), (a0, a1, b0, b1)
+
+    def cell_points(self, j, i_from, i_to):
+        # points of the cells i_from..i_to in row j
+        return self.order[self.start[j * self.cells + i_from]:self.start[j * self.cells + i_to + 1]]
+
+    def border_points(self, rect):
+        # points of the cells cut by an edge of the rectangle that lie inside it
+        (i0, i1, j0, j1), (a0, a1, b0, b1) = self.cell_range(rect)
+        candidates = []
+        for j in range(j0, j1 + 1):
+            if b0 <= j <= b1 and a0 <= a1:
+                if i0 < a0:
+                    candidates.append(self.cell_points(j, i0, a0 - 1))
+                if a1 < i1:
+                    candidates.append(self.cell_points(j, a1 + 1, i1))
+            else:
+                candidates.append(self.cell_points(j, i0, i1))
+        points = np.concatenate(candidates) if candidates else np.array([], dtype=np.int32)
+        x_min, x_max, y_min, y_max = rect
+        x, y = self.x[points], self.y[points]
+        return points[(x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)]
+
+    def select(self, rect):
+        # positions of the points in the rectangle, in their original order
+        (i0, i1, j0, j1), (a0, a1, b0, b1) = self.cell_range(rect)
+        inner = [self.cell_points(j, a0, a1) for j in range(b0, b1 + 1)] if a0 <= a1 else []
+        return np.sort(np.concatenate(inner + [self.border_points(rect)]))
+
+    def count(self, rect):
+        # points per cluster in the rectangle
+        (i0, i1, j0, j1), (a0, a1, b0, b1) = self.cell_range(rect)
+        border = self.labels[self.border_points(rect)]
+        counts = {}
+        for c in self.clusters:
+            inner = 0
+            if a0 <= a1 and b0 <= b1:
+                sat = self.sat[c]
+                inner = sat[b1 + 1, a1 + 1] - sat[b0, a1 + 1] - sat[b1 + 1, a0] + sat[b0, a0]
+            counts[c] = int(inner + np.count_nonzero(border == c))
+        return counts
+
+
+grid_index = GridIndex(cluster_df['X'], cluster_df['Y'], cluster_df['cluster'])
+
+
+class DensityGrid:
+    # fine 2-D histogram over the whole data per cluster, kept as summed-area tables.
+    # The counts of a bin are differences of the table at its four corners.
+    def __init__(self, x, y, codes, clusters, cells=512):
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        self.cells = cells
+        self.x0, self.y0 = x.min(), y.min()
+        self.width = (x.max() - self.x0) / cells or 1.0
+        self.height = (y.max() - self.y0) / cells or 1.0
+        i = np.clip(np.floor((x - self.x0) / self.width), 0, cells - 1).astype(int)
+        j = np.clip(np.floor((y - self.y0) / self.height), 0, cells - 1).astype(int)
+        counts = np.bincount((codes * cells + j) * cells + i, minlength=len(clusters) * cells ** 2)
+        counts = counts.reshape(len(clusters), cells, cells)
+        # sat[c, j, i] = points of cluster c in the cells below row j and left of column i
+        self.sat = np.pad(counts.cumsum(axis=1).cumsum(axis=2), ((0, 0), (1, 0), (1, 0))).astype(np.int32)
+
+    def cell_position(self, edges, v0, size):
+        # cell edge at or below each bin edge and the fraction of the cell above it
+        u = np.clip((edges - v0) / size, 0, self.cells)
+        k = np.minimum(np.floor(u).astype(int), self.cells - 1)
+        return k, u - k
+
+    def histogram(self, rect, nbins):
+        # counts [cluster, y bin, x bin] of nbins equal bins over the viewport and the bin edges,
+        # None when the viewport spans fewer cells than bins (zoomed in too far for the grid)
+        x_min, x_max, y_min, y_max = rect
+        if (x_max - x_min) / self.width < nbins or (y_max - y_min) / self.height < nbins:
+            return None
+        x_edges, y_edges = np.linspace(x_min, x_max, nbins + 1), np.linspace(y_min, y_max, nbins + 1)
+        i, fx = self.cell_position(x_edges, self.x0, self.width)
+        j, fy = self.cell_position(y_edges, self.y0, self.height)
+        # the table between the cell edges is interpolated bilinearly (points spread evenly in a cell)
+        corner = lambda jj, ii: self.sat[:, jj[:, None], ii[None, :]]
+        fx, fy = fx[None, :], fy[:, None]
+        sat = ((1 - fy) * ((1 - fx) * corner(j, i) + fx * corner(j, i + 1))
+               + fy * ((1 - fx) * corner(j + 1, i) + fx * corner(j + 1, i + 1)))
+        counts = sat[:, 1:, 1:] - sat[:, :-1, 1:] - sat[:, 1:, :-1] + sat[:, :-1, :-1]
+        return counts.clip(min=0), x_edges, y_edges
+
+
+density_grid = DensityGrid(cluster_df['X'], cluster_df['Y'], cluster_code, CLUSTERS)
+
 app.layout = html.Div([html.Div([html.H1("Dashboard 6")], style={'margin': '10px 25px 25px 25px'}), html.Div([dcc.Tabs(id="tabs", children=[
     dcc.Tab(label='Tab One', children=[html.Div([
         dbc.Row([dbc.Col([dcc.Dropdown(options=['red', 'green', 'blue'], value='red', id='color', multi=False)], width=6),
@@ -45,29 +200,151 @@ app.layout = html.Div([html.Div([html.H1("Dashboard 6")], style={'margin': '10px
                  dbc.Col(html.Div(id="cluster-info"),width=2 ,style={"margin-top": "20px"})
                  ]),
         dbc.Row([dbc.Col(html.Div([dbc.Label("Number of bins:", html_for="graph_5_nbins"),
-                                   dcc.Dropdown(options= [str(i) for i in range(5, 100, 5)], value='40', id='graph_5_nbins', multi=False)]),width={"size": 3},),
+                                   dcc.Dropdown(options= [str(i) for i in range(5, 100, 5)], value='40', id='graph_5_nbins', multi=False, clearable=False)]),width={"size": 3},),
                  dbc.Col(html.Div([dbc.Label("Color:", html_for="graph_5_color"),
-                                   dcc.Dropdown(options=["Viridis", "Magma", "Hot", "GnBu", "Greys"], value='Viridis', id='graph_5_color', multi=False)]),width={"size": 3,"offset": 1},),
+                                   dcc.Dropdown(options=["Viridis", "Magma", "Hot", "GnBu", "Greys"], value='Viridis', id='graph_5_color', multi=False, clearable=False)]),width={"size": 3,"offset": 1},),
                  dbc.Col(html.Div([dbc.Label("Separated for Cluster:", html_for="graph_5_separated"),
                                    dcc.RadioItems(options=["Yes","No"], value='No', id='graph_5_separated')]),width={"size": 3,"offset": 1},)]),
         dbc.Row([dbc.Col([dcc.Graph(id="graph_5")], width=12),])
     ], style={"margin": "10px 25px 25px 25px"})
     ])])])])
 
+def selected_rectangle(selected_data):
+    # zoomed rectangle of plot 3 (x_min, x_max, y_min, y_max), None when not zoomed;
+    # an axis that was not zoomed is not limited
+    if selected_data is None or (isinstance(selected_data, dict) and 'xaxis.range[0]' not in selected_data and 'yaxis.range[0]' not in selected_data):
+        return None
+    return (selected_data.get('xaxis.range[0]', -np.inf), selected_data.get('xaxis.range[1]', np.inf),
+            selected_data.get('yaxis.range[0]', -np.inf), selected_data.get('yaxis.range[1]', np.inf))
+
+# a zoom triggers three callbacks with the same relayoutData (often at the same time),
+# the selection (row positions) and the counts of the last rectangles are kept and computed only once
+SELECTION_CACHE_SIZE = 16
+selection_cache = OrderedDict()
+# selection_lock guards the cache and key_locks, a key lock is held while its value is computed
+selection_lock = threading.Lock()
+key_locks = {}
+
+def memoized(kind, rect, compute):
+    # the first caller of a key computes it, the others with the same key wait for it;
+    # callers of other keys are not blocked
+    key = (kind, rect)
+    with selection_lock:
+        if key in selection_cache:
+            selection_cache.move_to_end(key)
+            return selection_cache[key]
+        key_lock = key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        with selection_lock:
+            if key in selection_cache:
+                selection_cache.move_to_end(key)
+                return selection_cache[key]
+        try:
+            value = compute()
+            with selection_lock:
+                selection_cache[key] = value
+                if len(selection_cache) > SELECTION_CACHE_SIZE:
+                    selection_cache.popitem(last=False)
+        finally:
+            with selection_lock:
+                key_locks.pop(key, None)
+    return value
+
+def selected_positions(selected_data):
+    # row positions of the points in the zoomed rectangle, all rows (slice) when not zoomed
+    rect = selected_rectangle(selected_data)
+    if rect is None:
+        return slice(None)
+    return memoized('points', rect, lambda: grid_index.select(rect))
+
 def update_selected_data(selected_data):
-    if selected_data is None or (isinstance(selected_data, dict) and 'xaxis.range[0]' not in selected_data): cluster_dff = cluster_df
+    positions = selected_positions(selected_data)
+    return cluster_df if isinstance(positions, slice) else cluster_df.iloc[positions]
+
+def cluster_counts(selected_data):
+    # points per cluster of the selection (without selecting the points)
+    rect = selected_rectangle(selected_data)
+    if rect is None:
+        rect = (-np.inf, np.inf, -np.inf, np.inf)
+    return memoized('counts', rect, lambda: pd.Series(grid_index.count(rect)))
+
+def viewport(selected_data):
+    # zoomed rectangle limited to the data (all data when not zoomed)
+    x_min, x_max, y_min, y_max = selected_rectangle(selected_data) or (-np.inf, np.inf, -np.inf, np.inf)
+    return (max(x_min, grid_index.x.min()), min(x_max, grid_index.x.max()),
+            max(y_min, grid_index.y.min()), min(y_max, grid_index.y.max()))
+
+def rasterize(positions, rect):
+    # RGBA pixels (top row first) of the points in the rectangle: the colors of the clusters
+    # in a pixel mixed by their counts, the opacity grows with the (log) number of points
+    x_min, x_max, y_min, y_max = rect
+    width, height = RASTER_SIZE
+    col = ((grid_index.x[positions] - x_min) / ((x_max - x_min) or 1.0) * width).astype(int).clip(0, width - 1)
+    row = ((y_max - grid_index.y[positions]) / ((y_max - y_min) or 1.0) * height).astype(int).clip(0, height - 1)
+    codes = cluster_code[positions]
+    counts = np.bincount((codes * height + row) * width + col, minlength=len(CLUSTERS) * height * width)
+    counts = counts.reshape(len(CLUSTERS), height, width)
+    total = counts.sum(axis=0)
+    rgb = np.tensordot(counts, CLUSTER_RGB, axes=(0, 0)) / np.maximum(total, 1)[..., None]
+    alpha = np.where(total > 0, 64 + 191 * np.log1p(total) / np.log1p(max(total.max(), 1)), 0)
+    return np.dstack([rgb, alpha]).astype(np.uint8)
+
+def png_uri(rgba):
+    # data uri of an RGBA image (8 bit, no filter)
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+    height, width, _ = rgba.shape
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4)]).tobytes()
+    png = (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+           + chunk(b'IDAT', zlib.compress(raw, 6)) + chunk(b'IEND', b''))
+    return 'data:image/png;base64,' + base64.b64encode(png).decode()
+
+def raster_figure(positions, rect):
+    # the points as one image over the viewport instead of one marker per point
+    x_min, x_max, y_min, y_max = rect
+    fig = go.Figure()
+    # invisible corners, so that the axes (and a reset of the zoom) cover the image
+    fig.add_trace(go.Scatter(x=[x_min, x_max], y=[y_min, y_max], mode='markers', marker_opacity=0, hoverinfo='skip', showlegend=False))
+    for c in CLUSTERS:
+        fig.add_trace(go.Scatter(x=[None], y=[None], mode='markers', name=c, marker_color=COLORS[c]))
+    fig.add_layout_image(source=png_uri(rasterize(positions, rect)), xref='x', yref='y', x=x_min, y=y_max,
+                         sizex=x_max - x_min, sizey=y_max - y_min, sizing='stretch', layer='below')
+    fig.update_layout(xaxis_title='X', yaxis_title='Y', legend_title_text='cluster')
+    return fig
+
+def density(selected_data, nbins):
+    # counts per cluster and bin edges of plot 5 for the viewport of plot 3
+    x_min, x_max, y_min, y_max = viewport(selected_data)
+    histogram = density_grid.histogram((x_min, x_max, y_min, y_max), nbins)
+    if histogram is None:
+        # bin the selected points themselves
+        positions = selected_positions(selected_data)
+        x, y, codes = grid_index.x[positions], grid_index.y[positions], cluster_code[positions]
+        x_edges = np.linspace(x_min, max(x_max, x_min + density_grid.width), nbins + 1)
+        y_edges = np.linspace(y_min, max(y_max, y_min + density_grid.height), nbins + 1)
+        counts = np.stack([np.histogram2d(y[codes == k], x[codes == k], bins=[y_edges, x_edges])[0]
+                           for k in range(len(CLUSTERS))]).astype(int)
+        histogram = counts, x_edges, y_edges
+    return histogram
+
+def colorscale(color):
+    # the named scale, the default scale of the template when there is none (as px does)
+    if not color:
+        return [list(step) for step in pio.templates["plotly_white"].layout.colorscale.sequential]
+    return get_colorscale(color)
+
+def density_figure(counts, x_edges, y_edges, color, separated):
+    # heatmap of the counts (one per cluster side by side when separated), all on one color axis
+    heatmap = dict(x=x_edges, y=y_edges, coloraxis="coloraxis", hovertemplate="X=%{x}<br>Y=%{y}<br>count=%{z:.0f}<extra></extra>")
+    if separated == "No":
+        fig = go.Figure(go.Heatmap(z=counts.sum(axis=0), **heatmap))
     else:
-        cluster_dff =\
-            cluster_df[
-          (cluster_df['X'] >=
-              selected_data.get('xaxis.range[0]')) &
-          (cluster_df['X'] <=
-              selected_data.get('xaxis.range[1]')) &
-          (cluster_df['Y'] >=
-              selected_data.get('yaxis.range[0]')) &
-          (cluster_df['Y'] <=
-              selected_data.get('yaxis.range[1]'))]
-    return cluster_dff
+        fig = make_subplots(rows=1, cols=len(CLUSTERS), shared_yaxes=True, horizontal_spacing=0.02, subplot_titles=[f"cluster={c}" for c in CLUSTERS])
+        for k in range(len(CLUSTERS)):
+            fig.add_trace(go.Heatmap(z=counts[k], **heatmap), row=1, col=k + 1)
+    fig.update_layout(template="plotly_white", coloraxis=dict(colorscale=colorscale(color), colorbar_title_text="count"), yaxis_title_text="Y")
+    fig.update_xaxes(title_text="X")
+    return fig
 
 @app.callback(Output("graph_1", "figure"), Input("color", "value"))
 
@@ -94,16 +371,20 @@ def update_graph_3_and_4(selected_data):
 
     PLOT_HEIGHT = 400
 
-    cluster_dff = update_selected_data(selected_data=selected_data)
+    group_counts = cluster_counts(selected_data)
 
-    fig3 = px.scatter(cluster_dff, x="X", y="Y", color="cluster", color_discrete_map=COLORS, category_orders={"cluster": ["0", "1", "2"]})
+    if group_counts.sum() > MARKER_LIMIT:
+        fig3 = raster_figure(selected_positions(selected_data), viewport(selected_data))
+    else:
+        cluster_dff = update_selected_data(selected_data=selected_data)
+        fig3 = px.scatter(cluster_dff, x="X", y="Y", color="cluster", color_discrete_map=COLORS, category_orders={"cluster": ["0", "1", "2"]})
 
     fig3.update_layout(height=PLOT_HEIGHT, template="plotly_white", coloraxis_showscale=False)
     fig3.update_traces(marker=dict(size=8))
 
-    group_counts = cluster_dff[['cluster', 'X']].groupby('cluster').count()
+    group_counts = group_counts[group_counts > 0]
 
-    fig4 = go.Figure(data=[go.Bar(x=group_counts.index, y=group_counts['X'], marker_color=[COLORS.get(i) for i in group_counts.index])])
+    fig4 = go.Figure(data=[go.Bar(x=group_counts.index, y=group_counts.values, marker_color=[COLORS.get(i) for i in group_counts.index])])
 
     fig4.update_layout(height=PLOT_HEIGHT, template="plotly_white", title="<b>Counts per cluster</b>", xaxis_title="cluster", title_font_size=25)
 
@@ -112,19 +393,21 @@ def update_graph_3_and_4(selected_data):
 @app.callback(Output("graph_5", "figure"), Input("graph_5_nbins", "value"), Input("graph_5_color", "value"), Input("graph_5_separated", "value"), Input("graph_3", "relayoutData"),)
 
 def update_graph_5(nbins, color, separated, selected_data):
-    cluster_dff = update_selected_data(selected_data=selected_data)
+    if ctx.triggered_id == "graph_5_color":
+        # only the colors change, the counts in the browser stay
+        fig = Patch()
+        fig["layout"]["coloraxis"]["colorscale"] = colorscale(color)
+        return fig
 
-    fig = px.density_heatmap(cluster_dff, x="X", y="Y", nbinsx=int(nbins), nbinsy=int(nbins), color_continuous_scale=color, facet_col=None if separated == "No" else "cluster",
-        category_orders={"cluster": ["0", "1", "2"]})
-    fig.update_layout(template="plotly_white")
+    fig = density_figure(*density(selected_data, int(nbins)), color, separated)
     return fig
 
 @app.callback(Output("cluster-info", "children"), Input("graph_3", "relayoutData"))
 def update_cluster_info(selected_data):
-    cluster_dff = update_selected_data(selected_data=selected_data)
-    cluster_counts = cluster_dff['cluster'].value_counts().reset_index()
-    cluster_counts.columns = ['Cluster', 'Count']
-    return dbc.Table.from_dataframe(cluster_counts, striped=True, bordered=True, hover=True)
+    counts = cluster_counts(selected_data)
+    counts = counts[counts > 0].sort_values(ascending=False, kind='stable').reset_index()
+    counts.columns = ['Cluster', 'Count']
+    return dbc.Table.from_dataframe(counts, striped=True, bordered=True, hover=True)
 
 if __name__ == '__main__':
     app.run_server(debug=True, port=8014)
\ No newline at end of file
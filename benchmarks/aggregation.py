@@ -0,0 +1,80 @@
+# AGGREGATION: PANDAS GROUPBY VS. BINCOUNT KERNELS
+#-------------------------------------------------------------------
+# Usage (from the repository root):
+#   python benchmarks/aggregation.py [--scales 1 10 100] [--repeat 5] [--json aggregation.json]
+# Builds the dataset `scale` times (rows copied, still ordered by year) and
+# aggregates selections of different sizes for the bar chart (sales per
+# value of the main filter) and the line chart (sales per year and value),
+# once with groupby on a frame of the selection (aggregate_by_filter,
+# aggregate_by_year) and once with ColumnStore.sum_by / sum_by_year.
+# Both results are compared, the best of `repeat` runs is reported.
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+os.environ['DASHBOARD_ACCESS_LOG'] = ''
+sys.path.insert(0, '.')
+import main
+
+SELECTIONS = {
+    'all years': ([1980, 2020], {}),
+    '2005-2010': ([2005, 2010], {}),
+    'action games': ([1980, 2020], {'Genre': ['Action']}),
+    'wii sports games': ([2005, 2015], {'Platform': ['Wii'], 'Genre': ['Sports']}),
+}
+
+def best_ms(func, repeat):
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, round(min(timings), 3)
+
+def scaled_store(scale):
+    dataset = pd.concat([main.datasets.get(main.DEFAULT_DATASET).df] * scale, ignore_index=True).sort_values('Year', kind='stable', ignore_index=True)
+    return main.ColumnStore(dataset)
+
+def same_result(grouped, summed, key):
+    merged = grouped.merge(summed, on=key, suffixes=('_groupby', '_bincount'))
+    return len(merged) == len(grouped) == len(summed) and np.allclose(merged['Global_groupby'], merged['Global_bincount'])
+
+def run(scales, repeat, main_filter='Publisher'):
+    results = []
+    for scale in scales:
+        store = scaled_store(scale)
+        for name, (year, filters) in SELECTIONS.items():
+            positions = store.select(year, filters)
+            frame = store.frame(positions, ['Year', main_filter] + main.REGIONS + ['Global'])
+            by_filter, groupby_bar = best_ms(lambda: main.aggregate_by_filter(main_filter, frame), repeat)
+            by_year, groupby_line = best_ms(lambda: main.aggregate_by_year(main_filter, frame), repeat)
+            summed, bincount_bar = best_ms(lambda: store.sum_by(main_filter, positions), repeat)
+            summed_year, bincount_line = best_ms(lambda: store.sum_by_year(main_filter, positions), repeat)
+            results.append({'rows': store.rows, 'selection': name, 'selected_rows': len(positions),
+                            'groupby_bar_ms': groupby_bar, 'bincount_bar_ms': bincount_bar,
+                            'groupby_line_ms': groupby_line, 'bincount_line_ms': bincount_line,
+                            'same_result': bool(same_result(by_filter, summed, main_filter)
+                                                and same_result(by_year, summed_year, ['Year', main_filter]))})
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    results = run(args.scales, args.repeat)
+    print(f"{'rows':>10} {'selection':<18} {'selected':>10} {'bar groupby':>12} {'bincount':>9} {'line groupby':>13} {'bincount':>9}  same")
+    for r in results:
+        print(f"{r['rows']:>10} {r['selection']:<18} {r['selected_rows']:>10} {r['groupby_bar_ms']:>10.2f}ms"
+              f" {r['bincount_bar_ms']:>7.2f}ms {r['groupby_line_ms']:>11.2f}ms {r['bincount_line_ms']:>7.2f}ms  {r['same_result']}")
+
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump(results, out, indent=1)
@@ -0,0 +1,80 @@
+# BOOT TIME PROFILE OF main.py
+#-------------------------------------------------------------------
+# Usage (from the repository root):
+#   python benchmarks/boot_profile.py [--runs 5] [--json boot_profile.json]
+# Imports main.py in fresh interpreters (like a gunicorn worker or a dyno
+# restart) and reports the import wall time, the time until the first
+# layout and chart requests are answered and the most expensive imports
+# from `python -X importtime`.
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+BOOT = r'''
+import json, os, sys, time
+os.environ['DASHBOARD_ACCESS_LOG'] = ''
+start = time.perf_counter()
+sys.path.insert(0, '.')
+import main
+imported = time.perf_counter()
+
+client = main.app.server.test_client()
+client.get('/_dash-layout')
+layout = time.perf_counter()
+
+dataset = main.DEFAULT_DATASET
+year = main.year_range(dataset)
+main.update_gauges(dataset, [], [], [], [], [], year)
+main.update_bar_chart(dataset, 'Platform', [], [], [], [], [], year)
+main.update_line_chart(dataset, 'Platform', [], [], [], [], [], year)
+main.update_table(dataset, [], [], [], [], [], year)
+charts = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000,
+                  'first_layout_ms': (layout - imported) * 1000,
+                  'first_charts_ms': (charts - layout) * 1000}))
+'''
+
+def boot_times(runs):
+    results = []
+    for i in range(runs):
+        output = subprocess.run([sys.executable, '-c', BOOT], capture_output=True, text=True, check=True)
+        results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {key: round(statistics.median(result[key] for result in results), 1) for key in results[0]}
+
+def import_times():
+    # "import time: self [us] | cumulative | <indent>package", indentation = nesting level
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'],
+                            capture_output=True, text=True, check=True)
+    modules = []
+    for line in output.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append({'module': name.strip(), 'level': (len(name) - len(name.lstrip())) // 2,
+                        'self_ms': int(self_us) / 1000, 'cumulative_ms': int(cumulative_us) / 1000})
+    return modules
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--json', help='write the profile to this file')
+    args = parser.parse_args()
+
+    times = boot_times(args.runs)
+    modules = import_times()
+    # direct imports of main.py (level 1) and main.py itself
+    direct = sorted((m for m in modules if m['level'] <= 1), key=lambda m: m['cumulative_ms'], reverse=True)
+
+    print(f'median of {args.runs} boots')
+    for key, value in times.items():
+        print(f'  {key:<18} {value:>8.1f} ms')
+    print(f'\nmost expensive imports (cumulative, of a single run)')
+    for module in direct[:args.top]:
+        print(f"  {module['module']:<36} {module['cumulative_ms']:>8.1f} ms")
+
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump({'boot': times, 'imports': direct}, out, indent=1)
@@ -0,0 +1,140 @@
+# CHART BUILDERS AT SCALE: AGGREGATION VS. FIGURE BUILDING
+#-------------------------------------------------------------------
+# Usage (from the repository root):
+#   python benchmarks/chart_builders.py [--rows 16301 1000000 10000000] [--repeat 5]
+#                                       [--json chart_builders.json] [--compare baseline.json]
+# Runs the chart functions of main.py directly on datasets of `rows` games
+# (drawn from the csv, see synthetic_dataset; 16301 is the csv itself), with
+# Genre (12 values) and Publisher (about 580 values) as main filter and
+# selections from all years down to a single platform and genre (10 million
+# rows need about 2.6 GB of memory). Every panel is timed in three stages
+# (best of `repeat` runs):
+#   aggregate: ColumnStore.sum_by / sum_by_year / sales + region_shares of the selection
+#   figure:    stacked_bar_chart_plotly, line_diagram, gauge_chart, calculate_global_share
+#   serialize: to_json of the result (what the callback sends to the browser)
+# The selection itself (select_ms) is not part of any stage.
+# --json writes the results with the commit and library versions, --compare
+# prints the change against such a file and exits with 1 when a stage of a
+# panel got slower than --threshold times (at least --min-ms slower).
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import plotly
+
+os.environ['DASHBOARD_ACCESS_LOG'] = ''
+sys.path.insert(0, '.')
+import main
+from dash._utils import to_json
+
+SELECTIONS = {
+    'all years': ([1980, 2020], {}),
+    '2005-2010': ([2005, 2010], {}),
+    'action games': ([1980, 2020], {'Genre': ['Action']}),
+    'wii sports games': ([2005, 2015], {'Platform': ['Wii'], 'Genre': ['Sports']}),
+}
+MAIN_FILTERS = ['Genre', 'Publisher']
+STAGES = ['aggregate_ms', 'figure_ms', 'serialize_ms']
+
+def best_ms(func, repeat):
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, round(min(timings), 3)
+
+def dataset_of(rows):
+    base = main.datasets.get(main.DEFAULT_DATASET).df
+    return base if rows == len(base) else main.synthetic_dataset(base, rows)
+
+def panels(store, year_sales, main_filter, year, positions):
+    # name -> (aggregation, figure builder of its result)
+    def shares():
+        return main.region_shares(store.sales(positions), main.window_totals(year_sales, year))
+    return {
+        'bar': (lambda: store.sum_by(main_filter, positions), lambda grouped: main.stacked_bar_chart_plotly(main_filter, grouped)),
+        'line': (lambda: store.sum_by_year(main_filter, positions), lambda grouped: main.line_diagram(main_filter, grouped)),
+        'gauges': (shares, main.gauge_chart),
+        'global_share': (shares, main.calculate_global_share),
+    }
+
+def run(rows_list, repeat):
+    results = []
+    # plotly.express is imported with the first chart
+    main.stacked_bar_chart_plotly('Genre', main.datasets.get(main.DEFAULT_DATASET).store.sum_by('Genre', np.arange(10)))
+    for rows in rows_list:
+        frame = dataset_of(rows)
+        store, year_sales = main.ColumnStore(frame), main.sales_by_year(frame)
+        for selection, (year, filters) in SELECTIONS.items():
+            positions, select_ms = best_ms(lambda: store.select(year, filters), repeat)
+            for main_filter in MAIN_FILTERS:
+                for panel, (aggregate, build) in panels(store, year_sales, main_filter, year, positions).items():
+                    aggregated, aggregate_ms = best_ms(aggregate, repeat)
+                    result, figure_ms = best_ms(lambda: build(aggregated), repeat)
+                    body, serialize_ms = best_ms(lambda: to_json(result), repeat)
+                    results.append({'rows': store.rows, 'main_filter': main_filter, 'selection': selection,
+                                    'selected_rows': len(positions), 'panel': panel,
+                                    'groups': len(aggregated) if isinstance(aggregated, pd.DataFrame) else None,
+                                    'select_ms': select_ms, 'aggregate_ms': aggregate_ms, 'figure_ms': figure_ms,
+                                    'serialize_ms': serialize_ms, 'bytes': len(body)})
+        del frame, store
+    return results
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'plotly': plotly.__version__, 'machine': platform.machine()}
+
+def key(result):
+    return result['rows'], result['main_filter'], result['selection'], result['panel']
+
+def compare(results, baseline, threshold, min_ms):
+    # stages that got slower than the baseline (same rows, main filter, selection and panel)
+    before = {key(r): r for r in baseline['results']}
+    slower = []
+    print(f"\ncompared with {baseline['environment'].get('commit')} ({baseline['environment'].get('date')})")
+    for r in results:
+        old = before.get(key(r))
+        if old is None:
+            continue
+        for stage in STAGES:
+            ratio = r[stage] / old[stage] if old[stage] else float('inf')
+            if ratio > threshold and r[stage] - old[stage] > min_ms:
+                slower.append((r, stage, old[stage], ratio))
+    for r, stage, old, ratio in slower:
+        print(f"  slower: {r['rows']} rows {r['main_filter']:<9} {r['selection']:<16} {r['panel']:<12} {stage:<12} {old:.2f} -> {r[stage]:.2f}ms ({ratio:.2f}x)")
+    print(f"  {len(slower)} slower stages")
+    return slower
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[16301, 1000000, 10000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='results of an earlier run (--json) to compare with')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    parser.add_argument('--min-ms', type=float, default=0.5)
+    args = parser.parse_args()
+
+    results = run(args.rows, args.repeat)
+    print(f"{'rows':>9} {'filter':<9} {'selection':<16} {'selected':>9} {'panel':<12} {'groups':>6} {'aggregate':>10} {'figure':>9} {'serialize':>10} {'bytes':>8}")
+    for r in results:
+        print(f"{r['rows']:>9} {r['main_filter']:<9} {r['selection']:<16} {r['selected_rows']:>9} {r['panel']:<12} {r['groups'] or '':>6}"
+              f" {r['aggregate_ms']:>8.2f}ms {r['figure_ms']:>7.2f}ms {r['serialize_ms']:>8.2f}ms {r['bytes']:>8}")
+
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump({'environment': environment(), 'results': results}, out, indent=1)
+    if args.compare:
+        with open(args.compare) as baseline:
+            sys.exit(1 if compare(results, json.load(baseline), args.threshold, args.min_ms) else 0)
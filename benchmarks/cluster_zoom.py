@@ -0,0 +1,93 @@
+# LATENCY OF A ZOOM IN THE CLUSTER EXERCISE (aufgabenblätter/_04_Aufgabe_8b.py)
+#-------------------------------------------------------------------
+# Usage (from the repository root, needs scikit-learn for make_blobs):
+#   python benchmarks/cluster_zoom.py [--points 7500 100000 1000000] [--zooms 20] [--json cluster_zoom.json]
+# A zoom on graph_3 triggers three callbacks with the same relayoutData. They are
+# posted through the Flask test client for a series of random zoom rectangles,
+# once with the shared selection (memoized per rectangle) and once with the
+# cache emptied before every callback (each one computes its own selection).
+# Reports the median time per zoom (all three callbacks) and the selection share.
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MEASURE = r'''
+import importlib.util, json, statistics, sys, time
+import numpy as np
+
+spec = importlib.util.spec_from_file_location('aufgabe_8b', 'aufgabenblätter/_04_Aufgabe_8b.py')
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+client = module.app.server.test_client()
+zooms = int(sys.argv[1])
+
+# the callbacks that depend on graph_3.relayoutData with the other inputs at their defaults
+defaults = {'graph_5_nbins': '40', 'graph_5_color': 'Viridis', 'graph_5_separated': 'No'}
+bodies = []
+for dependency in client.get('/_dash-dependencies').get_json():
+    if not any(i['id'] == 'graph_3' for i in dependency['inputs']):
+        continue
+    outputs = [{'id': o.rsplit('.', 1)[0], 'property': o.rsplit('.', 1)[1]} for o in dependency['output'].strip('.').split('...')]
+    bodies.append({'output': dependency['output'], 'outputs': outputs if len(outputs) > 1 else outputs[0],
+                   'inputs': [{'id': i['id'], 'property': i['property'], 'value': defaults.get(i['id'])} for i in dependency['inputs']],
+                   'changedPropIds': ['graph_3.relayoutData'], 'state': []})
+
+def zoom(relayout, shared):
+    start = time.perf_counter()
+    for body in bodies:
+        if not shared:
+            module.selection_cache.clear()
+        for i in body['inputs']:
+            if i['id'] == 'graph_3':
+                i['value'] = relayout
+        response = client.post('/_dash-update-component', json=body)
+        assert response.status_code == 200, response.data[:500]
+    return (time.perf_counter() - start) * 1000
+
+rng = np.random.default_rng(0)
+x, y = module.cluster_df['X'], module.cluster_df['Y']
+zoom({}, True)  # warm up (first figure build, json encoder)
+result = {'points': len(module.cluster_df), 'callbacks': len(bodies)}
+timings = {False: [], True: []}
+selection = []
+for i in range(zooms):
+    xs, ys = np.sort(rng.uniform(x.min(), x.max(), 2)), np.sort(rng.uniform(y.min(), y.max(), 2))
+    relayout = {'xaxis.range[0]': xs[0], 'xaxis.range[1]': xs[1], 'yaxis.range[0]': ys[0], 'yaxis.range[1]': ys[1]}
+    # both modes on the same rectangle, alternating which goes first
+    for shared in ((False, True) if i % 2 else (True, False)):
+        module.selection_cache.clear()
+        timings[shared].append(zoom(relayout, shared))
+    # time of the selection alone (what the sharing saves per extra callback)
+    module.selection_cache.clear()
+    start = time.perf_counter()
+    module.update_selected_data(relayout)
+    module.cluster_counts(relayout)
+    selection.append((time.perf_counter() - start) * 1000)
+result['separate_ms'] = round(statistics.median(timings[False]), 1)
+result['shared_ms'] = round(statistics.median(timings[True]), 1)
+result['selection_ms'] = round(statistics.median(selection), 2)
+print(json.dumps(result))
+'''
+
+def measure(points, zooms):
+    env = dict(os.environ, CLUSTER_POINTS=str(points))
+    output = subprocess.run([sys.executable, '-c', MEASURE, str(zooms)], env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--points', type=int, nargs='+', default=[7500, 100000, 1000000])
+    parser.add_argument('--zooms', type=int, default=20)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    results = [measure(points, args.zooms) for points in args.points]
+    print(f"{'points':>10} {'separate':>12} {'shared':>12}  {'selection':>10}   (median per zoom, {results[0]['callbacks']} callbacks)")
+    for r in results:
+        print(f"{r['points']:>10} {r['separate_ms']:>10.1f}ms {r['shared_ms']:>10.1f}ms  {r['selection_ms']:>8.2f}ms")
+
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump(results, out, indent=1)
@@ -0,0 +1,87 @@
+# FIRST BYTE AND TRANSFER SIZE OF A PAGE LOAD
+#-------------------------------------------------------------------
+# Usage (from the repository root):
+#   python benchmarks/layout_transfer.py
+# Loads the app in a fresh process per layout mode and requests what the
+# browser requests on a page load: the index page, the layout and the
+# initial callbacks. Times are measured with the Flask test client.
+import json
+import os
+import subprocess
+import sys
+
+MEASURE = r'''
+import json, sys, time
+sys.path.insert(0, '.')
+import main
+
+client = main.app.server.test_client()
+
+def timed(method, url, **kwargs):
+    start = time.perf_counter()
+    response = getattr(client, method)(url, **kwargs)
+    return response, (time.perf_counter() - start) * 1000
+
+result = {}
+for name, url in [('index', '/'), ('layout', '/_dash-layout')]:
+    timings = []
+    for i in range(5):
+        response, ms = timed('get', url)
+        timings.append(ms)
+    result[name] = {'bytes': len(response.data), 'ms': round(min(timings), 1)}
+
+# initial callbacks with the values of the layout
+props = {}
+def walk(node):
+    if isinstance(node, dict) and 'props' in node:
+        if isinstance(node['props'].get('id'), str):
+            props[node['props']['id']] = node['props']
+        for value in node['props'].values():
+            walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            walk(value)
+walk(client.get('/_dash-layout').get_json())
+
+def initial_callbacks():
+    total_bytes, total_ms = 0, 0
+    for dependency in client.get('/_dash-dependencies').get_json():
+        if dependency.get('prevent_initial_call') or dependency.get('clientside_function'):
+            continue
+        outputs = [{'id': o.rsplit('.', 1)[0], 'property': o.rsplit('.', 1)[1].split('@')[0]}
+                   for o in dependency['output'].strip('.').split('...')]
+        body = {'output': dependency['output'], 'outputs': outputs if len(outputs) > 1 else outputs[0],
+                'changedPropIds': [],
+                'inputs': [{'id': i['id'], 'property': i['property'],
+                            'value': props.get(i['id'], {}).get(i['property'])} for i in dependency['inputs']],
+                'state': [{'id': i['id'], 'property': i['property'],
+                           'value': props.get(i['id'], {}).get(i['property'])} for i in dependency['state']]}
+        response, ms = timed('post', '/_dash-update-component', json=body)
+        total_bytes += len(response.data)
+        total_ms += ms
+    return {'bytes': total_bytes, 'ms': round(total_ms, 1)}
+
+# first visit after the start, then a second visit that can use cached results
+result['initial_callbacks'] = initial_callbacks()
+result['initial_callbacks_again'] = initial_callbacks()
+print(json.dumps(result))
+'''
+
+# layout modes: environment of the app
+MODES = {
+    'full': {'DASHBOARD_SNAPSHOT': '0', 'DASHBOARD_LAZY_LAYOUT': '0'},
+    'lazy': {'DASHBOARD_SNAPSHOT': '0', 'DASHBOARD_LAZY_LAYOUT': '1'},
+    'snapshot': {'DASHBOARD_SNAPSHOT': '1'},
+}
+
+def measure(mode):
+    env = dict(os.environ, **MODES[mode], DASHBOARD_ACCESS_LOG='')
+    output = subprocess.run([sys.executable, '-c', MEASURE], env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+if __name__ == '__main__':
+    for mode in MODES:
+        result = measure(mode)
+        print(f'{mode} layout')
+        for name, values in result.items():
+            print(f"  {name:<24} {values['bytes']:>10} bytes {values['ms']:>9} ms")
@@ -5,19 +5,68 @@
 
 # IMPORT LIBRARIES
 #-------------------------------------------------------------------
+import atexit
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import pickle
+import queue
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from urllib.parse import parse_qsl, urlencode
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no file locks between processes (see file_lock)
+    fcntl = None
+
+import numpy as np
 import pandas as pd
+import flask
+from flask import request, jsonify
 from dash import Dash, dcc, html, dash_table
-from dash.dependencies import Input, Output
-import plotly.express as px
+from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 import dash
+from dash._callback import NoUpdate
+from dash._utils import to_json
+from dash.exceptions import PreventUpdate
+
+# plotly.express is imported in the chart functions that use it. With DASHBOARD_SNAPSHOT=1 (the
+# default) the snapshot builds the charts at import, so it is loaded at start-up anyway (once in
+# the master with --preload); only without the snapshot it waits for the first chart request.
+# plotly.graph_objects is lazy by itself
 
 # FUNKTIONEN
 #-------------------------------------------------------------------
-def stacked_bar_chart_plotly(main_filter, dataset):
+REGIONS = ['North America', 'Europe', 'Japan', 'Others']
+FILTERS = ['Platform', 'Company', 'Publisher', 'Genre', 'Console']
+
+def filter_data(dataset, year, filters):
+    # time window first, then every dropdown selection that is not empty
+    min_year, max_year = year
+    data_time = dataset[dataset['Year'].between(min_year, max_year)]
+
+    filtered_data = data_time
+    for column, values in filters.items():
+        if values:
+            filtered_data = filtered_data[filtered_data[column].isin(values)]
+    return data_time, filtered_data
+
+def aggregate_by_filter(main_filter, dataset):
     # extract and copy date from df
-    df_bar = dataset[[main_filter,'North America', 'Europe', 'Japan', 'Others', 'Global']]
+    df_bar = dataset[[main_filter] + REGIONS + ['Global']]
 
     # group by filter and sort by global sales
     df_bar_grouped = df_bar.groupby([main_filter]).sum()
@@ -26,10 +75,166 @@ def stacked_bar_chart_plotly(main_filter, dataset):
     #main filter as column in data frame
     df_bar_grouped.reset_index(inplace=True)
     df_bar_grouped = df_bar_grouped.rename(columns={'index':main_filter})
+    return df_bar_grouped
+
+def aggregate_by_year(main_filter, dataset):
+    return dataset.groupby(['Year', main_filter], as_index=False)['Global'].sum()
+
+TABLE_COLUMNS = ['Name', 'Platform', 'Genre', 'Global']
+
+class ColumnStore:
+    # the dataset as numpy column buffers (views of the DataFrame, no copies), the dropdown
+    # columns dictionary encoded. A selection is an integer array of row positions, filters
+    # and aggregations read through it, so nothing proportional to the whole data is allocated.
+    # The rows have to be ordered by Year: a time window is a contiguous range of rows.
+    def __init__(self, dataset):
+        self.rows = len(dataset)
+        self.year = dataset['Year'].to_numpy()
+        if np.any(self.year[1:] < self.year[:-1]):
+            raise ValueError('the dataset must be sorted by Year')
+        # first row of every year (and the end of the last one)
+        self.years, starts = np.unique(self.year, return_index=True)
+        self.offsets = np.append(starts, self.rows)
+        self.rank = dataset['Rank'].to_numpy()
+        self.numbers = {column: dataset[column].to_numpy() for column in REGIONS + ['Global']}
+        self.labels = {column: dataset[column].to_numpy() for column in TABLE_COLUMNS}
+        self.codes, self.categories, self.lookup = {}, {}, {}
+        for column in FILTERS:
+            codes, categories = pd.factorize(dataset[column], sort=True)
+            self.codes[column] = codes.astype(np.int32)
+            self.categories[column] = np.asarray(categories, dtype=object)
+            self.lookup[column] = {value: code for code, value in enumerate(categories)}
+
+    def window(self, year):
+        # first and end row of a time window, by binary search in the year offsets
+        min_year, max_year = year
+        return (self.offsets[np.searchsorted(self.years, min_year, side='left')],
+                self.offsets[np.searchsorted(self.years, max_year, side='right')])
+
+    def select(self, year, filters, positions=None):
+        # rows of the time window (out of `positions`, if given) with every dropdown selection,
+        # positions are always ascending
+        start, end = self.window(year)
+        if positions is not None:
+            positions = positions[np.searchsorted(positions, start):np.searchsorted(positions, end)]
+            for column, values in filters.items():
+                if values:
+                    positions = positions[self.wanted(column, values)[self.codes[column][positions]]]
+            return positions
+
+        # only the rows of the window are read
+        return self.select_range(start, end, filters)
+
+    def select_range(self, start, end, filters):
+        # rows start..end-1 with every dropdown selection
+        keep = None
+        for column, values in filters.items():
+            if values:
+                hit = self.wanted(column, values)[self.codes[column][start:end]]
+                keep = hit if keep is None else keep & hit
+        if keep is None:
+            return np.arange(start, end)
+        return start + np.flatnonzero(keep)
+
+    def select_chunks(self, year, filters, chunk_rows):
+        # the selection in pieces, each from at most chunk_rows rows of the window
+        start, end = self.window(year)
+        for chunk in range(start, end, chunk_rows):
+            yield self.select_range(chunk, min(chunk + chunk_rows, end), filters)
+
+    def wanted(self, column, values):
+        # lookup table code -> selected
+        wanted = np.zeros(len(self.categories[column]), dtype=bool)
+        wanted[[self.lookup[column][value] for value in values if value in self.lookup[column]]] = True
+        return wanted
+
+    def values(self, column, positions):
+        # sorted labels that occur in the selection
+        present = np.bincount(self.codes[column][positions], minlength=len(self.categories[column]))
+        return self.categories[column][present > 0]
+
+    def sales(self, positions):
+        return np.array([self.numbers[column][positions].sum() for column in REGIONS + ['Global']])
+
+    def column(self, column, positions):
+        if column == 'Rank':
+            return self.rank[positions]
+        if column in self.codes:
+            return self.categories[column][self.codes[column][positions]]
+        if column == 'Year':
+            return self.year[positions]
+        if column in self.numbers:
+            return self.numbers[column][positions]
+        return self.labels[column][positions]
+
+    def frame(self, positions, columns):
+        # small DataFrame with only the needed columns of the selection (for the charts)
+        return pd.DataFrame({column: self.column(column, positions) for column in columns})
+
+    def sales_cube(self, column, positions, regions=REGIONS + ['Global']):
+        # sales per year x value of column x region as a dense array, one bincount per
+        # region over the combined code year * values + value (and the number of rows per cell)
+        values = len(self.categories[column])
+        # row positions are ascending and the rows ordered by year: the year of a row is its offset
+        cells = (np.searchsorted(self.offsets, positions, side='right') - 1) * values + self.codes[column][positions]
+        size = len(self.years) * values
+        rows = np.bincount(cells, minlength=size).reshape(len(self.years), values)
+        cube = np.stack([np.bincount(cells, weights=self.numbers[region][positions], minlength=size)
+                         for region in regions], axis=-1).reshape(len(self.years), values, len(regions))
+        return rows, cube
+
+    def sum_by(self, column, positions):
+        # sales per value of column, best selling first (like aggregate_by_filter)
+        rows, cube = self.sales_cube(column, positions)
+        present = rows.sum(axis=0) > 0
+        # without the float noise of the plain summation (pandas sums are compensated),
+        # it would make the figures bigger
+        sums = np.round(cube.sum(axis=0)[present], 8)
+        order = np.argsort(-sums[:, -1], kind='stable')
+        grouped = pd.DataFrame(sums[order], columns=REGIONS + ['Global'])
+        grouped.insert(0, column, self.categories[column][present][order])
+        return grouped
+
+    def sum_by_year(self, column, positions):
+        # global sales per year and value of column, ordered by both (like aggregate_by_year)
+        rows, cube = self.sales_cube(column, positions, ['Global'])
+        years, values = np.nonzero(rows)
+        return pd.DataFrame({'Year': self.years[years],
+                             column: self.categories[column][values],
+                             'Global': np.round(cube[years, values, 0], 8)})
+
+    def page(self, positions, page, page_size, sort_column=None, descending=False):
+        # rows of one table page, sorted (stable) by sort_column, by rank otherwise
+        positions = positions[np.argsort(self.rank[positions], kind='stable')]
+        if sort_column:
+            values = self.column(sort_column, positions)
+            if descending:
+                # stable descending: sort the reversed values and map back
+                order = len(values) - 1 - np.argsort(values[::-1], kind='stable')[::-1]
+            else:
+                order = np.argsort(values, kind='stable')
+            positions = positions[order]
+        rows = positions[page * page_size:(page + 1) * page_size]
+        return self.frame(rows, TABLE_COLUMNS).to_dict('records')
+
+def facet_options(store, year, filters):
+    # options of every dropdown, each one filtered by all the other dropdowns
+    options = {}
+    for column in FILTERS:
+        others = {key: values for key, values in filters.items() if key != column}
+        options[column] = store.values(column, store.select(year, others)).tolist()
+    return options
+
+BAR_COLORS = ['#006276','#1a889d','#80bdc9','#b3d7de']
+LINE_COLORS = ['#006276', '#015666', '#1a889d', '#4da3b3', '#80bdc9', '#b3d7de', '#cce5e9',  '#2b6b51', '#317a5c','#378a68','#50a381', '#77b89d', '#9eccb9']
+
+def px_stacked_bar_chart(main_filter, df_bar_grouped):
+    # df_bar_grouped: sales per value of main_filter (aggregate_by_filter or ColumnStore.sum_by)
 
     # dropout Global Sales
-    df_bar_grouped = df_bar_grouped[[main_filter, 'North America', 'Europe', 'Japan', 'Others']]
-    fig = px.bar(df_bar_grouped, x=main_filter, y=['North America', 'Europe', 'Japan', 'Others'], color_discrete_sequence=['#006276','#1a889d','#80bdc9','#b3d7de'])
+    df_bar_grouped = df_bar_grouped[[main_filter] + REGIONS]
+    import plotly.express as px
+    fig = px.bar(df_bar_grouped, x=main_filter, y=REGIONS, color_discrete_sequence=BAR_COLORS)
 
     fig.update_xaxes(showline=True, linewidth=1, linecolor='black', title=None)
     fig.update_yaxes(showline=True, linewidth=1, linecolor='black', title='Number of sales (in million)')
@@ -47,11 +252,12 @@ def stacked_bar_chart_plotly(main_filter, dataset):
                       ))
     return fig
 
-def line_diagram(main_filter, dataset):
-    df_l = dataset.groupby(['Year', main_filter], as_index=False)['Global'].sum()
+def px_line_diagram(main_filter, df_l):
+    # df_l: global sales per year and value of main_filter (aggregate_by_year or ColumnStore.sum_by_year)
     dfl_unique = df_l['Year'].unique()
 
-    line_fig = px.line(df_l, x='Year', y='Global', color=main_filter, color_discrete_sequence=['#006276', '#015666', '#1a889d', '#4da3b3', '#80bdc9', '#b3d7de', '#cce5e9',  '#2b6b51', '#317a5c','#378a68','#50a381', '#77b89d', '#9eccb9'])
+    import plotly.express as px
+    line_fig = px.line(df_l, x='Year', y='Global', color=main_filter, color_discrete_sequence=LINE_COLORS)
     line_fig.update_layout(plot_bgcolor='white',paper_bgcolor='white')
     line_fig.update_xaxes(showline=True, linewidth=1, linecolor='black', range=[1980, 2020])
     if len(dfl_unique) == 1:
@@ -69,36 +275,836 @@ def line_diagram(main_filter, dataset):
     )
     return line_fig
 
-def calculate_global_share(main_filter, dataset, data_time):
-    df_global = dataset[[main_filter, "Global"]]
-    global_share = round(df_global["Global"].sum() / data_time["Global"].sum() * 100, 1)
-    return f'Global: {global_share}%'
-
-def gauge_chart(main_filter, dataset, region, data_time):
-    df_gauge = dataset[[main_filter, region]]
-
-    # calculate the market share
-    marktanteil_sales = round(df_gauge[region].sum() / data_time[region].sum() * 100, 1)
-
-    # Gauge Chart
-    fig_gaug = go.Figure(go.Indicator(
-        domain={'x': [0, 1], 'y': [0, 1]},
-        value=marktanteil_sales,
-        number={'suffix': '%', 'font': {'size': 15, 'family': 'Arial Black'}},
-        mode='gauge+number',
-        #title={'text': region, 'font': {'size': 13}},
-        gauge={'axis': {'range': [None, 100]},
-               'bar': {'color': '#378a68', 'thickness': 0.5},
-               'steps': [{'range': [0, 100], 'color': '#b3d7de'},],
-               }
-    ))
+# px validates every trace and every update_* call, with hundreds of traces (Publisher)
+# that costs much more than the aggregation. The px figures of a placeholder value are
+# built once per chart and main filter, the charts are their layout and trace settings
+# filled with the aggregated arrays, without validating them again.
+PLACEHOLDER = '\x00'
+# px.line draws with webgl (scattergl) above this number of rows
+PX_WEBGL_ROWS = 1000
+figure_templates = {}
+# px is not thread safe (it reads the default template while building), one px figure at a time
+px_lock = threading.Lock()
+
+def figure_template(chart, main_filter, webgl=False):
+    # layout and traces of the px figure of a placeholder value
+    key = (chart, main_filter, webgl)
+    if key in figure_templates:
+        return figure_templates[key]
+    with px_lock:
+        if key in figure_templates:
+            return figure_templates[key]
+        if chart == 'bar':
+            fig = px_stacked_bar_chart(main_filter, pd.DataFrame({main_filter: [PLACEHOLDER], **{region: [0.0] for region in REGIONS}}))
+        else:
+            # more than one year (no annotation of a single year)
+            rows = PX_WEBGL_ROWS + 1 if webgl else 2
+            fig = px_line_diagram(main_filter, pd.DataFrame({'Year': 1980 + np.arange(rows) % 41, main_filter: [PLACEHOLDER] * rows, 'Global': np.zeros(rows)}))
+        figure = fig.to_plotly_json()
+        figure_templates[key] = figure['layout'], figure['data']
+        return figure_templates[key]
+
+def stacked_bar_chart_plotly(main_filter, df_bar_grouped):
+    # same figure as px_stacked_bar_chart: one trace per region
+    if len(df_bar_grouped) == 0:
+        # px leaves out traces and legend title, cheap without data
+        with px_lock:
+            return px_stacked_bar_chart(main_filter, df_bar_grouped)
+    layout, traces = figure_template('bar', main_filter)
+    x = df_bar_grouped[main_filter].to_numpy()
+    data = [dict(trace, x=x, y=df_bar_grouped[region].to_numpy()) for trace, region in zip(traces, REGIONS)]
+    return go.Figure(data=data, layout=layout, _validate=False)
+
+def line_diagram(main_filter, df_l):
+    # same figure as px_line_diagram: one trace per value of main_filter (in the order of
+    # their first row), the colors repeat after LINE_COLORS
+    if len(df_l) == 0:
+        with px_lock:
+            return px_line_diagram(main_filter, df_l)
+    layout, (trace,) = figure_template('line', main_filter, len(df_l) > PX_WEBGL_ROWS)
+    codes, names = pd.factorize(df_l[main_filter])
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+    years, sales = df_l['Year'].to_numpy()[order], df_l['Global'].to_numpy()[order]
+    data = []
+    for i, name in enumerate(names):
+        data.append(dict(trace, x=years[bounds[i]:bounds[i + 1]], y=sales[bounds[i]:bounds[i + 1]], name=name, legendgroup=name,
+                         hovertemplate=trace['hovertemplate'].replace(PLACEHOLDER, str(name)),
+                         line=dict(trace['line'], color=LINE_COLORS[i % len(LINE_COLORS)])))
+    line_fig = go.Figure(data=data, layout=layout, _validate=False)
+
+    dfl_unique = df_l['Year'].unique()
+    if len(dfl_unique) == 1:
+        star_year = dfl_unique[0]
+        line_fig.add_annotation(
+            x=star_year,
+            y=df_l[df_l['Year'] == star_year]['Global'].values[0],
+            text='*',
+            showarrow=False,
+            font=dict(size=20),
+        )
+    return line_fig
+
+def sales_by_year(dataset):
+    # sales per year and region, the totals of any time window are a sum of its rows
+    return dataset.groupby('Year')[REGIONS + ['Global']].sum()
+
+def window_totals(year_sales, year):
+    min_year, max_year = year
+    return year_sales.loc[min_year:max_year].to_numpy().sum(axis=0)
+
+def region_sales(dataset):
+    # sales of the selection in every region (and global) in one pass
+    return dataset[REGIONS + ['Global']].to_numpy().sum(axis=0)
+
+def region_shares(sales, totals):
+    # market shares from the sales of the selection and of the time window
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shares = np.round(sales / totals * 100, 1)
+    return dict(zip(REGIONS + ['Global'], shares.tolist()))
+
+def error_text(error):
+    # half width of a preview interval, ? when the sample has none
+    return '?' if np.isnan(error) else error
+
+def calculate_global_share(shares, errors=None):
+    if errors is not None:
+        return f"Global: {shares['Global']}% ± {error_text(errors['Global'])}% (preview)"
+    return f"Global: {shares['Global']}%"
+
+# height of one gauge and of the region name above it
+GAUGE_HEIGHT = 110
+GAUGE_TITLE_HEIGHT = 28
+
+def gauge_chart(shares, errors=None):
+    # one figure with a gauge per region, stacked from top to bottom
+    # (errors: half width of the approximate 95% interval of a preview)
+    row_height = GAUGE_HEIGHT + GAUGE_TITLE_HEIGHT
+    height = row_height * len(REGIONS)
+
+    fig_gaug = go.Figure()
+    for i, region in enumerate(REGIONS):
+        top = 1 - (i * row_height + GAUGE_TITLE_HEIGHT) / height
+        bottom = 1 - (i + 1) * row_height / height
+        fig_gaug.add_trace(go.Indicator(
+            domain={'x': [0, 1], 'y': [bottom, top]},
+            value=shares[region],
+            number={'suffix': '%' if errors is None else f'% ±{error_text(errors[region])}',
+                    'font': {'size': 15, 'family': 'Arial Black'}},
+            mode='gauge+number',
+            title={'text': region, 'font': {'size': 14}},
+            gauge={'axis': {'range': [None, 100]},
+                   'bar': {'color': '#378a68', 'thickness': 0.5},
+                   'steps': [{'range': [0, 100], 'color': '#b3d7de'},],
+                   }
+        ))
     fig_gaug.update_layout(
         margin=dict(l=55, r=55, t=0, b=0),
-        height=110,
+        height=height,
 
     )
     return fig_gaug
 
+def read_dataset(path):
+    # ordered by Year (by rank within a year), so every time window is a slice of rows
+    return pd.read_csv(path).sort_values('Year', kind='stable', ignore_index=True)
+
+def synthetic_dataset(base, rows, seed=0):
+    # `rows` games drawn from `base` (with replacement), to try the dashboard at scale
+    rng = np.random.default_rng(seed)
+    dataset = base.iloc[rng.integers(0, len(base), rows)].reset_index(drop=True)
+    dataset['Rank'] = dataset['Global'].rank(ascending=False, method='first').astype(np.int64)
+    return dataset.sort_values(['Year', 'Rank'], ignore_index=True)
+
+def stratified_sample(dataset, fraction, min_rows=30, top_fraction=0.01, size_classes=3, boost=3, seed=0):
+    # random rows of every year and size class (stratum), the sales are weighted with rows / sampled
+    # rows of the stratum. The games are split into `size_classes` classes of equal count by their
+    # global sales, every class is sampled `boost` times as densely as the one below (`fraction` of
+    # the rows on average): the sums and their uncertainty depend on the few big games.
+    # The best selling games are always included (weight 1), they would make the estimates very
+    # uncertain otherwise.
+    rng = np.random.default_rng(seed)
+    top = (dataset['Global'] >= dataset['Global'].quantile(1 - top_fraction)).to_numpy()
+    edges = dataset['Global'][~top].quantile(np.linspace(0, 1, size_classes + 1)[1:-1]).to_numpy()
+    size = np.searchsorted(edges, dataset['Global'].to_numpy()[~top], side='right')
+    # stratum: year * size_classes + size class, -1 for the best selling games
+    stratum = np.full(len(dataset), -1)
+    stratum[~top] = dataset['Year'].to_numpy()[~top] * size_classes + size
+    rates = boost ** np.arange(size_classes)
+    rates = rates / rates.mean() * fraction
+
+    positions = [np.flatnonzero(top)]
+    for key, rows in pd.Series(np.flatnonzero(~top)).groupby(stratum[~top]).agg(list).items():
+        positions.append(rng.choice(rows, min(len(rows), max(min_rows, round(len(rows) * rates[key % size_classes]))), replace=False))
+    positions = np.sort(np.concatenate(positions))
+
+    sample = dataset.iloc[positions].copy()
+    sample['stratum'] = stratum[positions]
+    stratum_rows = pd.Series(stratum).value_counts()
+    sample['weight'] = (sample['stratum'].map(stratum_rows) / sample['stratum'].map(sample['stratum'].value_counts())).to_numpy()
+    sample[REGIONS + ['Global']] = sample[REGIONS + ['Global']].mul(sample['weight'], axis=0)
+    return sample
+
+# 97.5% quantile of the standard normal distribution
+NORMAL_975 = 1.959963984540054
+
+def t_quantile(df, z=NORMAL_975):
+    # quantile of Student's t distribution (df degrees of freedom) for the normal quantile z,
+    # Cornish-Fisher expansion (Abramowitz & Stegun 26.7.5), close from 3 degrees of freedom on
+    df = np.maximum(df, 1.0)
+    return (z + (z**3 + z) / (4 * df) + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * df**2)
+            + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * df**3)
+            + (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z) / (92160 * df**4))
+
+def estimate_errors(sample_time, selected):
+    # half width of the approximate 95% interval of the estimated sales per region, nan when no
+    # sampled row of the selection lies outside the best selling games (nothing to estimate from).
+    # Variance of a stratified sample: sum of N^2 (1 - n/N) s^2 / n over the strata (s^2 of the
+    # sales of the selected rows, 0 for the others), times the t quantile for the Satterthwaite
+    # degrees of freedom (from the selected rows per stratum): few rows give wider intervals.
+    columns = REGIONS + ['Global']
+    hit = sample_time.index.isin(selected)
+    values = sample_time[columns].div(sample_time['weight'], axis=0)
+    values[~hit] = 0
+
+    strata = sample_time['stratum']
+    n = strata.groupby(strata).size().to_numpy()[:, None]
+    hits = pd.Series(hit, index=sample_time.index).groupby(strata).sum().to_numpy()[:, None]
+    weight = sample_time['weight'].groupby(strata).first().to_numpy()[:, None]
+    variance = values.groupby(strata).var(ddof=1).fillna(0).to_numpy()
+    parts = (n * weight) ** 2 * (1 - 1 / weight) * variance / n
+    total = parts.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df = total ** 2 / (parts ** 2 / np.maximum(hits - 1, 1)).sum(axis=0)
+    errors = t_quantile(np.nan_to_num(df, nan=np.inf)) * np.sqrt(total)
+    return errors if np.any(hit & (sample_time['weight'] > 1).to_numpy()) else np.full(len(columns), np.nan)
+
+def mark_preview(fig):
+    fig.update_layout(title={'text': 'Preview from a sample, the exact numbers follow',
+                             'font': {'size': 11, 'color': '#6c757d'}})
+    return fig
+
+# number of options a searchable dropdown sends to the browser
+SEARCH_LIMIT = 50
+
+def build_search_index(dataset, column):
+    # unique values ranked by global sales (rank 0 = best selling)
+    ranked = dataset.groupby(column)['Global'].sum().sort_values(ascending=False, kind='stable')
+    values = ranked.index.to_numpy()
+    lower = np.array([str(i).lower() for i in values])
+
+    # sorted lower case labels for the prefix lookup
+    order = np.argsort(lower, kind='stable')
+    return {'values': values, 'lower': lower, 'sorted_lower': lower[order], 'sorted_rank': order}
+
+def search_options(index, search_value, allowed=None, selected=None, limit=SEARCH_LIMIT):
+    values = index['values']
+    selected = list(selected or [])
+
+    # the values the other filters leave, before any matching (they decide whether the list is full)
+    keep = np.ones(len(values), dtype=bool) if allowed is None else np.isin(values, allowed)
+    if search_value:
+        term = search_value.lower()
+        # prefix matches: binary search on the sorted labels
+        lo = np.searchsorted(index['sorted_lower'], term, side='left')
+        hi = np.searchsorted(index['sorted_lower'], term + '\uffff', side='left')
+        prefix = np.sort(index['sorted_rank'][lo:hi])
+        ranks = prefix[keep[prefix]]
+        # substring matches only if the prefix matches do not fill the list
+        if len(ranks) < limit + len(selected):
+            contains = np.flatnonzero((np.char.find(index['lower'], term) > 0) & keep)
+            ranks = np.concatenate([ranks, contains])
+    else:
+        ranks = np.flatnonzero(keep)
+
+    # keep the selected values as options, otherwise the dropdown drops their labels
+    matches = [i for i in values[ranks[:limit + len(selected)]] if i not in selected][:limit]
+    return [{'label': i, 'value': i} for i in selected + matches]
+
+def result_nbytes(value):
+    # estimated memory of a cached value: arrays by their buffers, anything else by its pickled size
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, tuple) and any(isinstance(item, np.ndarray) for item in value):
+        return sum(result_nbytes(item) for item in value)
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+class ResultCache:
+    # thread safe LRU cache for callback results. Every entry keeps its size and the time of its
+    # last use, so the dataset registry can drop the oldest entries when its memory budget is exceeded
+    # (on_grow is called after every put, see DatasetRegistry.trim)
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.on_grow = None
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                value, nbytes, _ = self.entries[key]
+                self.entries[key] = (value, nbytes, time.monotonic())
+                self.entries.move_to_end(key)
+                return True, value
+        return False, None
+
+    def put(self, key, value):
+        nbytes = result_nbytes(value)
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (value, nbytes, time.monotonic())
+            self.bytes += nbytes
+            while len(self.entries) > self.maxsize:
+                self.bytes -= self.entries.popitem(last=False)[1][1]
+        if self.on_grow is not None:
+            self.on_grow()
+
+    def oldest(self):
+        # time of the last use of the least recently used entry, None when empty
+        with self.lock:
+            return next((used for _, _, used in self.entries.values()), None)
+
+    def evict_oldest(self):
+        with self.lock:
+            if self.entries:
+                self.bytes -= self.entries.popitem(last=False)[1][1]
+
+    def discard(self, version):
+        # drops the entries of a dataset version (the first element of every key)
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == version]:
+                self.bytes -= self.entries.pop(key)[1]
+
+# counters of the worker, served by /api/v1/metrics
+metrics = Counter()
+metrics_lock = threading.Lock()
+
+def count(name, value=1):
+    with metrics_lock:
+        metrics[name] += value
+
+def count_max(name, value):
+    with metrics_lock:
+        metrics[name] = max(metrics[name], value)
+
+class SharedPickler(pickle.Pickler):
+    # dash.no_update is written as a reference, an unpickled copy would not be the singleton
+    def persistent_id(self, obj):
+        return 'no_update' if isinstance(obj, NoUpdate) else None
+
+class SharedUnpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        if pid == 'no_update':
+            return dash.no_update
+        raise pickle.UnpicklingError(f'unknown persistent id {pid!r}')
+
+# without fcntl (Windows, no gunicorn: one process) a lock per path keeps the threads apart
+thread_file_locks = {}
+thread_file_locks_lock = threading.Lock()
+
+@contextmanager
+def file_lock(path):
+    # exclusive lock of a file among the processes (and threads) of a machine
+    with open(path, 'a') as lock_file:
+        if fcntl is None:
+            with thread_file_locks_lock:
+                lock = thread_file_locks.setdefault(path, threading.Lock())
+            with lock:
+                yield
+            return
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+class SingleFlight:
+    # concurrent calls with the same key wait for one computation and share its result.
+    # With a shared directory the workers also wait for each other (file locks), result
+    # and lock files older than `ttl` are removed.
+    def __init__(self, shared_dir=None, ttl=60):
+        self.shared_dir = shared_dir
+        self.ttl = ttl
+        self.calls = {}
+        self.lock = threading.Lock()
+        self.last_sweep = 0
+
+    def do(self, key, compute):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = {'done': threading.Event()}
+
+        if not leader:
+            call['done'].wait()
+            # the leader was dropped for its own page, this request still needs the result
+            if isinstance(call.get('error'), PreventUpdate):
+                return self.do(key, compute)
+            count('singleflight_shared')
+            if 'error' in call:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = self.compute_shared(key, compute) if self.shared_dir else compute()
+            return call['result']
+        except Exception as error:
+            call['error'] = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call['done'].set()
+
+    def compute_shared(self, key, compute):
+        self.sweep()
+        path = os.path.join(self.shared_dir, hashlib.sha1(repr(key).encode()).hexdigest())
+        if not self.is_fresh(path):
+            with file_lock(path + '.lock'):
+                # a lock file in use is not swept
+                os.utime(path + '.lock')
+                # another worker may have computed it while we were waiting for the lock
+                if not self.is_fresh(path):
+                    result = compute()
+                    with open(f'{path}.{os.getpid()}.tmp', 'wb') as result_file:
+                        SharedPickler(result_file, protocol=pickle.HIGHEST_PROTOCOL).dump(result)
+                    os.replace(f'{path}.{os.getpid()}.tmp', path + '.pkl')
+                    return result
+
+        # the result file is replaced atomically, so it can be read without the lock
+        try:
+            with open(path + '.pkl', 'rb') as result_file:
+                result = SharedUnpickler(result_file).load()
+        except FileNotFoundError:
+            # swept in the meantime
+            return compute()
+        count('singleflight_shared_workers')
+        return result
+
+    def is_fresh(self, path):
+        try:
+            return time.time() - os.path.getmtime(path + '.pkl') < self.ttl
+        except OSError:
+            return False
+
+    def sweep(self):
+        # removes the files of results that are no longer read (older than ttl), at most once per ttl
+        now = time.time()
+        with self.lock:
+            if now - self.last_sweep < self.ttl:
+                return
+            self.last_sweep = now
+        for entry in os.scandir(self.shared_dir):
+            if entry.name.endswith(('.pkl', '.lock', '.tmp')):
+                try:
+                    if now - entry.stat().st_mtime > self.ttl:
+                        os.remove(entry.path)
+                        count('singleflight_swept')
+                except OSError:
+                    pass
+
+class SupersededRequests:
+    # remembers the latest request per page and callback,
+    # older requests of the same page and callback are superseded
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.latest = OrderedDict()
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+
+    def begin(self, page, callback):
+        key = (page, callback)
+        with self.lock:
+            token = (key, next(self.sequence))
+            self.latest[key] = token[1]
+            self.latest.move_to_end(key)
+            while len(self.latest) > self.max_entries:
+                self.latest.popitem(last=False)
+        return token
+
+    def is_superseded(self, token):
+        key, number = token
+        return self.latest.get(key, number) > number
+
+class SelectionStore:
+    # last selection (filter state, row positions, sales) per dataset version and browser session,
+    # at most `max_sessions` sessions and `max_rows` stored row positions in total
+    def __init__(self, max_sessions=1000, max_rows=5_000_000):
+        self.max_sessions = max_sessions
+        self.max_rows = max_rows
+        self.rows = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, state, rows, sales):
+        with self.lock:
+            if key in self.entries:
+                self.rows -= len(self.entries.pop(key)['rows'])
+            self.entries[key] = {'state': state, 'rows': rows, 'sales': sales}
+            self.rows += len(rows)
+            # least recently used sessions first
+            while len(self.entries) > self.max_sessions or (self.rows > self.max_rows and len(self.entries) > 1):
+                _, evicted = self.entries.popitem(last=False)
+                self.rows -= len(evicted['rows'])
+                count('selection_evictions')
+
+    def discard(self, version):
+        # keys are (dataset version, session)
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == version]:
+                self.rows -= len(self.entries.pop(key)['rows'])
+
+def is_refinement(state, previous):
+    # every row of the new selection is also in the previous one
+    (min_year, max_year), filters = state
+    (previous_min, previous_max), previous_filters = previous
+    if min_year < previous_min or max_year > previous_max:
+        return False
+    for column, values in previous_filters.items():
+        if values and not (filters.get(column) and set(filters[column]) <= set(values)):
+            return False
+    return True
+
+def frame_bytes(frame):
+    # memory of a DataFrame, strings counted once per distinct value (equal strings
+    # are mostly the same object, memory_usage(deep=True) would count them per row)
+    size = 0
+    for column in frame.columns:
+        values = frame[column].to_numpy()
+        if values.dtype == object:
+            size += values.nbytes + sum(sys.getsizeof(value) for value in pd.unique(values))
+        else:
+            size += values.nbytes
+    return size
+
+class Dataset:
+    # a dataset and everything the callbacks compute from it: column store, sales per year,
+    # the sample for previews and the publisher search index
+    def __init__(self, name, frame, version, sample_fraction=None, stamp=None):
+        self.name = name
+        self.version = version
+        # modification time and size of the source when it was read (see source_stamp)
+        self.stamp = stamp
+        self.df = frame
+        self.store = ColumnStore(frame)
+        self.year_sales = sales_by_year(frame)
+        self.sample_df = None if sample_fraction is None else stratified_sample(frame, sample_fraction)
+        self.sample_store = None if self.sample_df is None else ColumnStore(self.sample_df)
+        self.publisher_index = build_search_index(frame, 'Publisher')
+
+        # the column store shares the buffers of the frame, only the codes are extra
+        stores = [self.store] if self.sample_store is None else [self.store, self.sample_store]
+        self.nbytes = (frame_bytes(frame) + (0 if self.sample_df is None else frame_bytes(self.sample_df))
+                       + sum(codes.nbytes for store in stores for codes in store.codes.values()))
+
+class DatasetRegistry:
+    # datasets by name, loaded on first use. Together with the entries of `caches` they stay under
+    # `budget` bytes: the least recently used datasets and cache entries are dropped first
+    # (and `on_evict` drops the cached results of a dropped dataset).
+    def __init__(self, sources, load, budget, on_evict=None, caches=()):
+        self.sources = sources
+        self.load = load
+        self.budget = budget
+        self.on_evict = on_evict
+        self.caches = list(caches)
+        self.loaded = OrderedDict()
+        self.used = {}
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.flight = SingleFlight()
+        for cache in self.caches:
+            cache.on_grow = self.trim
+
+    def get(self, name):
+        if name not in self.sources:
+            raise KeyError(f'unknown dataset {name!r}')
+        with self.lock:
+            dataset = self.loaded.get(name)
+            if dataset is not None:
+                self.loaded.move_to_end(name)
+                self.used[name] = time.monotonic()
+                return dataset
+        # the first requests of a dataset wait for one load
+        return self.flight.do(name, lambda: self.add(name))
+
+    def version(self, name):
+        return self.get(name).version
+
+    def loaded_dataset(self, name):
+        # the dataset if it is loaded, without loading it
+        with self.lock:
+            return self.loaded.get(name)
+
+    def reload(self, name):
+        # reads a loaded dataset again, returns (old, new) when its version changed
+        return self.flight.do(('reload', name), lambda: self.replace(name))
+
+    def replace(self, name):
+        old = self.loaded_dataset(name)
+        if old is None:
+            return None
+        dataset = self.load(name, self.sources[name])
+        with self.lock:
+            if self.loaded.get(name) is not old:
+                return None
+            if dataset.version == old.version:
+                # touched but not changed
+                old.stamp = dataset.stamp
+                return None
+            self.loaded[name] = dataset
+            self.bytes += dataset.nbytes - old.nbytes
+        count('dataset_reloads')
+        self.trim()
+        return old, dataset
+
+    def add(self, name):
+        with self.lock:
+            if name in self.loaded:
+                return self.loaded[name]
+
+        start = time.perf_counter()
+        dataset = self.load(name, self.sources[name])
+        count('dataset_loads')
+        count('dataset_load_ms', round((time.perf_counter() - start) * 1000))
+
+        with self.lock:
+            self.loaded[name] = dataset
+            self.used[name] = time.monotonic()
+            self.bytes += dataset.nbytes
+        self.trim()
+        return dataset
+
+    def total_bytes(self):
+        return self.bytes + sum(cache.bytes for cache in self.caches)
+
+    def trim(self):
+        # drops the least recently used dataset or cache entry until everything fits into the budget.
+        # The most recently used dataset stays, even if it is bigger than the budget on its own.
+        with self.lock:
+            while self.total_bytes() > self.budget:
+                candidates = [(used, cache) for cache in self.caches for used in [cache.oldest()] if used is not None]
+                if len(self.loaded) > 1:
+                    oldest = next(iter(self.loaded))
+                    candidates.append((self.used[oldest], None))
+                if not candidates:
+                    break
+                _, cache = min(candidates, key=lambda candidate: candidate[0])
+                if cache is not None:
+                    cache.evict_oldest()
+                    count('cache_evictions')
+                    continue
+                name, old = self.loaded.popitem(last=False)
+                del self.used[name]
+                self.bytes -= old.nbytes
+                count('dataset_evictions')
+                # its cached results go with it
+                if self.on_evict is not None:
+                    self.on_evict(old)
+
+    def info(self):
+        with self.lock:
+            return {'budget_bytes': self.budget, 'bytes': self.bytes,
+                    'cache_bytes': sum(cache.bytes for cache in self.caches),
+                    'loaded': {name: {'version': dataset.version, 'bytes': dataset.nbytes, 'rows': dataset.store.rows}
+                               for name, dataset in self.loaded.items()},
+                    'available': list(self.sources)}
+
+class EventHub:
+    # publish/subscribe within the worker (no broker): every subscriber has its own queue.
+    # A subscriber that does not keep up misses events, the next one carries the latest version.
+    def __init__(self, max_subscribers=100, queue_size=16):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        # a new queue, None when there are already max_subscribers
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            events = queue.Queue(maxsize=self.queue_size)
+            self.subscribers.add(events)
+            return events
+
+    def unsubscribe(self, events):
+        with self.lock:
+            self.subscribers.discard(events)
+
+    def publish(self, event):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for events in subscribers:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                count('push_dropped')
+
+# token of the request the current thread is working on
+request_state = threading.local()
+
+def check_superseded(stage='running'):
+    # stops the computation (no update for the browser) when a newer request
+    # of the same page for the same callback has arrived in the meantime
+    token = getattr(request_state, 'token', None)
+    if token is not None and superseded_requests.is_superseded(token):
+        count(f'superseded_{stage}')
+        raise PreventUpdate
+
+def session_id():
+    if not flask.has_request_context():
+        return None
+    return request.cookies.get(SESSION_COOKIE)
+
+def page_id():
+    # id of the dashboard page that sent the callback request (State of the page_id store),
+    # the tabs of a browser share the session cookie but every one has its own page id
+    if not flask.has_request_context():
+        return None
+    body = request.get_json(silent=True) or {}
+    return next((state.get('value') for state in body.get('state', []) if state.get('id') == 'page_id'), None)
+
+class AccessLog:
+    # how often each callback was requested with each (canonical) input state. The counts decay
+    # with a half life of `half_life` seconds and only the `max_states` most frequent states are
+    # kept (search terms and table pages would make the log grow without end). A background
+    # thread of every worker merges them into a json file shared by all workers every
+    # `flush_interval` seconds.
+    def __init__(self, path=None, flush_interval=60, max_states=1000, half_life=7 * 24 * 3600):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_states = max_states
+        self.half_life = half_life
+        self.pending = Counter()
+        self.flusher_pid = None
+        self.lock = threading.Lock()
+
+    def record(self, callback, args):
+        with self.lock:
+            self.pending[json.dumps([callback, args])] += 1
+            if len(self.pending) > 2 * self.max_states:
+                # the rarest states of the interval are dropped
+                self.pending = Counter(dict(self.pending.most_common(self.max_states)))
+            # threads do not survive the fork of the gunicorn workers, every worker starts its own
+            start = self.path and self.flusher_pid != os.getpid()
+            if start:
+                self.flusher_pid = os.getpid()
+        if start:
+            threading.Thread(target=self.flush_periodically, name='access_log', daemon=True).start()
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                count('access_log_errors')
+
+    def load(self):
+        # counts of the file, decayed to now
+        try:
+            with open(self.path) as log_file:
+                log = json.load(log_file)
+        except (OSError, ValueError):
+            return Counter()
+        # (files of older versions are a plain mapping state -> count)
+        states, updated = log.get('states', log), log.get('updated', time.time())
+        factor = 0.5 ** (max(0, time.time() - updated) / self.half_life)
+        return Counter({state: number * factor for state, number in states.items()})
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+        if not pending:
+            return
+        with file_lock(self.path + '.lock'):
+            states = self.load() + pending
+            log = {'updated': time.time(),
+                   'states': {state: round(number, 3) for state, number in states.most_common(self.max_states)}}
+            with open(f'{self.path}.{os.getpid()}.tmp', 'w') as log_file:
+                json.dump(log, log_file)
+            os.replace(f'{self.path}.{os.getpid()}.tmp', self.path)
+
+    def hottest(self, limit):
+        # most requested states first, including the ones not written yet
+        with self.lock:
+            states = (self.load() if self.path else Counter()) + self.pending
+        return [json.loads(state) for state, _ in states.most_common(limit)]
+
+def canonical_args(args):
+    # dropdown values in any order (and years as tuple) give the same key
+    return tuple(tuple(sorted(arg)) if isinstance(arg, list) else arg for arg in args)
+
+def cache_key(name, args):
+    # the first argument of a cached callback is the dataset name
+    return (datasets.version(args[0]), name, canonical_args(args))
+
+def cached_callback(func):
+    # results are reused as long as the dataset version does not change
+    @wraps(func)
+    def wrapper(*args):
+        key = cache_key(func.__name__, args)
+        if flask.has_request_context():
+            access_log.record(func.__name__, key[2])
+        # every request of a page counts, also one answered from the cache: the older requests
+        # of the page for this callback that are still running are superseded by it
+        page = page_id()
+        token = superseded_requests.begin(page, func.__name__) if page else None
+        found, result = result_cache.get(key)
+        if found:
+            count('cache_hits')
+            return result
+
+        request_state.token = token
+        try:
+            def compute():
+                check_superseded('before_start')
+                count('cache_misses')
+                return func(*args)
+            # identical requests that arrive at the same time are computed once
+            result = single_flight.do(key, compute)
+            result_cache.put(key, result)
+            # a newer request of the page may have been answered in the meantime (e.g. from the
+            # cache), a late result must not overwrite it
+            check_superseded('finished')
+        finally:
+            request_state.token = None
+        return result
+    cached_callbacks[func.__name__] = wrapper
+    return wrapper
+
+def warm_cache(limit=None, seconds=None, dataset=None):
+    # computes the results of the most requested states (most frequent first),
+    # e.g. at boot or after the dataset was reloaded (only its states when dataset is given)
+    limit = int(os.environ.get('DASHBOARD_WARM_STATES', 200)) if limit is None else limit
+    seconds = float(os.environ.get('DASHBOARD_WARM_SECONDS', 30)) if seconds is None else seconds
+    deadline = time.time() + seconds
+    states = [(callback, args) for callback, args in access_log.hottest(None)
+              if dataset is None or args[0] == dataset]
+    for callback, args in states[:limit]:
+        if time.time() > deadline:
+            break
+        if callback in cached_callbacks:
+            try:
+                cached_callbacks[callback](*[list(arg) if isinstance(arg, list) else arg for arg in args])
+            except Exception:
+                count('warm_errors')
+            else:
+                count('warm_states')
+
 alert = dbc.Alert('Please choose another period of time to avoid further disappointment!',
                   color='danger',
                   duration=5000,
@@ -108,27 +1114,237 @@ alert = dbc.Alert('Please choose another period of time to avoid further disappo
 # IMPORT DATA
 #-------------------------------------------------------------------
 # import clean data
-df = pd.read_csv('dataframe_videogames_clean.csv')
+DATA_PATH = 'dataframe_videogames_clean.csv'
+
+# datasets of the deployment: name=path of a csv file or name=synthetic:ROWS
+# (games drawn from DATA_PATH), separated by commas. The first one is shown first.
+DATASETS = dict(entry.strip().split('=', 1) for entry in
+                os.environ.get('DASHBOARD_DATASETS', f'videogames={DATA_PATH}').split(',') if entry.strip())
+DEFAULT_DATASET = next(iter(DATASETS))
+
+# approximate previews: off, on or auto (when the time window has more than DASHBOARD_APPROX_ROWS rows)
+APPROX_MODE = os.environ.get('DASHBOARD_APPROX_MODE', 'auto')
+APPROX_ROWS = int(os.environ.get('DASHBOARD_APPROX_ROWS', 1_000_000))
+SAMPLE_FRACTION = float(os.environ.get('DASHBOARD_SAMPLE_FRACTION', 0.015))
+
+def file_version(path):
+    # the version changes with the content of the file (used for ETags and caches)
+    with open(path, 'rb') as data_file:
+        return hashlib.sha1(data_file.read()).hexdigest()[:12]
+
+def source_stamp(source):
+    # cheap test for a changed source: modification time and size of its file
+    status = os.stat(DATA_PATH if source.startswith('synthetic:') else source)
+    return status.st_mtime_ns, status.st_size
+
+def load_dataset(name, source):
+    # the stamp is taken before reading, a change while reading is noticed next time
+    stamp = source_stamp(source)
+    if source.startswith('synthetic:'):
+        frame = synthetic_dataset(read_dataset(DATA_PATH), int(source.split(':', 1)[1]))
+        version = hashlib.sha1(f'{source}:{file_version(DATA_PATH)}'.encode()).hexdigest()[:12]
+    else:
+        frame, version = read_dataset(source), file_version(source)
+    return Dataset(name, frame, version, None if APPROX_MODE == 'off' else SAMPLE_FRACTION, stamp)
 
-# make a list for the list
-df_liste = df[['Name', 'Platform', 'Genre', 'Global']]
+def drop_cached_results(dataset):
+    # cached results of an evicted dataset are dropped with it
+    for cache in (result_cache, selection_cache, selection_store):
+        cache.discard(dataset.version)
+
+# callback results for the most recent filter states
+result_cache = ResultCache(maxsize=int(os.environ.get('DASHBOARD_CACHE_SIZE', 512)))
+
+# identical callback requests share one computation (set DASHBOARD_SINGLEFLIGHT_DIR
+# to a directory on the same machine to share it between the gunicorn workers)
+single_flight = SingleFlight(shared_dir=os.environ.get('DASHBOARD_SINGLEFLIGHT_DIR'))
+
+# callback name -> cached function, for the cache warmer
+cached_callbacks = {}
+
+# requested input states and their frequencies, the hottest ones are computed at boot
+access_log = AccessLog(path=os.environ.get('DASHBOARD_ACCESS_LOG', 'access_log.json') or None,
+                       max_states=int(os.environ.get('DASHBOARD_ACCESS_LOG_STATES', 1000)),
+                       half_life=float(os.environ.get('DASHBOARD_ACCESS_LOG_HALF_LIFE_HOURS', 168)) * 3600)
+
+# a browser session is recognised by a cookie (its last selection is kept), computations
+# for older interactions of the same page are dropped
+SESSION_COOKIE = 'dashboard_session'
+superseded_requests = SupersededRequests()
+
+# selections shared by the panel callbacks of the same interaction (per worker)
+selection_cache = ResultCache(maxsize=32)
+selection_flight = SingleFlight()
+
+# the last selection of every session, narrower selections are computed from it
+selection_store = SelectionStore(max_sessions=int(os.environ.get('DASHBOARD_SELECTION_SESSIONS', 1000)),
+                                 max_rows=int(os.environ.get('DASHBOARD_SELECTION_ROWS', 5_000_000)))
+
+# datasets are loaded on first use and share one memory budget (per worker) with the cached
+# results and selections
+datasets = DatasetRegistry(DATASETS, load_dataset,
+                           budget=int(float(os.environ.get('DASHBOARD_MEMORY_BUDGET_MB', 1024)) * 2**20),
+                           on_evict=drop_cached_results, caches=(result_cache, selection_cache))
+
+# the first dataset is loaded at start-up (with --preload before the workers are forked),
+# the layout is built from it
+datasets.get(DEFAULT_DATASET)
+
+# push (opt-in): every worker checks the files of its loaded datasets every DASHBOARD_PUSH_INTERVAL
+# seconds, reloads a changed one and tells the open dashboards through server-sent events
+PUSH = os.environ.get('DASHBOARD_PUSH', '0') == '1'
+PUSH_INTERVAL = float(os.environ.get('DASHBOARD_PUSH_INTERVAL', 5))
+# an open event stream holds a thread of the worker, it is closed after PUSH_STREAM_SECONDS
+# and the browser reconnects after PUSH_RETRY_MS
+PUSH_STREAM_SECONDS = 300
+PUSH_RETRY_MS = 5000
+PUSH_KEEPALIVE_SECONDS = 15
+# threads per worker (the Procfile passes DASHBOARD_THREADS to gunicorn --threads). Every open stream
+# holds one of them: by default half of them take streams, at least one is always left for the callbacks
+THREADS = int(os.environ.get('DASHBOARD_THREADS', 4))
+PUSH_CLIENTS = min(int(os.environ.get('DASHBOARD_PUSH_CLIENTS', THREADS // 2)), THREADS - 1)
+push_hub = EventHub(max_subscribers=PUSH_CLIENTS)
+
+def warm_reloaded(name):
+    # the most requested states and the snapshot of the new version, in the background
+    try:
+        warm_cache(dataset=name)
+        if SNAPSHOT and name == DEFAULT_DATASET:
+            app.serialized_layout()
+    except Exception:
+        count('warm_errors')
+
+def reload_dataset(name):
+    # reads a changed dataset again and tells the dashboards of this worker. The cached
+    # results of the old version stay (least recently used ones are dropped as usual),
+    # the push callback compares them with the new ones.
+    changed = datasets.reload(name)
+    if changed is not None:
+        old, new = changed
+        for cache in (selection_cache, selection_store):
+            cache.discard(old.version)
+        push_hub.publish({'dataset': name, 'version': new.version, 'previous': old.version})
+        threading.Thread(target=warm_reloaded, args=(name,), name='warm_reloaded', daemon=True).start()
+    return changed
+
+def check_dataset(name):
+    # reloads a loaded dataset whose source changed since it was read
+    data = datasets.loaded_dataset(name)
+    if data is not None and source_stamp(DATASETS[name]) != data.stamp:
+        return reload_dataset(name)
+    return None
+
+def watch_datasets():
+    while True:
+        time.sleep(PUSH_INTERVAL)
+        for name in datasets.info()['loaded']:
+            try:
+                check_dataset(name)
+            except Exception:
+                count('watch_errors')
+
+# threads do not survive the fork of the gunicorn workers, every worker starts its own watcher
+watcher_pid = None
+watcher_lock = threading.Lock()
+
+def start_watcher():
+    global watcher_pid
+    with watcher_lock:
+        if watcher_pid == os.getpid():
+            return
+        watcher_pid = os.getpid()
+    threading.Thread(target=watch_datasets, name='dataset_watcher', daemon=True).start()
+
+# lazy layout: the page is sent without table rows and dropdown options,
+# the first callbacks fill them in (from the result cache after the first visit)
+LAZY_LAYOUT = os.environ.get('DASHBOARD_LAZY_LAYOUT', '1') == '1'
+TABLE_PAGE_SIZE = 17
+
+def initial_options(column):
+    if LAZY_LAYOUT:
+        return []
+    return sorted([{'label': i, 'value': i} for i in datasets.get(DEFAULT_DATASET).df[column].unique()], key=lambda x: x['label'])
+
+def initial_table():
+    # first page of the first dataset and the number of pages
+    if LAZY_LAYOUT:
+        return [], None
+    store = datasets.get(DEFAULT_DATASET).store
+    return store.page(np.arange(store.rows), 0, TABLE_PAGE_SIZE), -(-store.rows // TABLE_PAGE_SIZE)
+
+def year_range(name=DEFAULT_DATASET):
+    years = datasets.get(name).store.years
+    return [int(years[0]), int(years[-1])]
+
+def export_url(dataset, year, filters):
+    # csv export of a selection, same parameters as /api/v1/aggregate
+    query = [('dataset', dataset), ('year_min', year[0]), ('year_max', year[1])]
+    query += [(column.lower(), value) for column, values in filters.items() for value in values or []]
+    return app.get_relative_path('/api/v1/export.csv') + '?' + urlencode(query)
 
 
 # START APP
 #-------------------------------------------------------------------
-app = Dash(__name__, external_stylesheets=[dbc.themes.FLATLY],
+class CachedLayoutDash(Dash):
+    # the layout is static, so it is serialized once per layout object and version
+    # of the first dataset instead of on every page load (with the default state
+    # written into it, see default_state)
+    layout_json = (None, None, None)
+    layout_lock = threading.Lock()
+
+    def serialized_layout(self):
+        key = (datasets.version(DEFAULT_DATASET), id(self._layout))
+        with self.layout_lock:
+            if self.layout_json[0] != key:
+                if SNAPSHOT:
+                    fill_layout(self._layout, default_state(DEFAULT_DATASET))
+                body = to_json(self._layout_value())
+                self.layout_json = (key, body, hashlib.sha1(body.encode()).hexdigest())
+            return self.layout_json[1:]
+
+    def serve_layout(self):
+        if self._layout_is_function:
+            return super().serve_layout()
+        # the browser revalidates its copy with the ETag
+        body, etag = self.serialized_layout()
+        if etag in request.if_none_match:
+            return flask.Response(status=304, headers={'ETag': f'"{etag}"'})
+        response = flask.Response(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+# snapshot: the page is sent with the outputs of the default state (no dropdown selection,
+# all years, computed once per dataset version), no callback runs when it is opened
+SNAPSHOT = os.environ.get('DASHBOARD_SNAPSHOT', '1') == '1'
+
+app = CachedLayoutDash(__name__, external_stylesheets=[dbc.themes.FLATLY],
+                prevent_initial_callbacks=SNAPSHOT,
 
                 # should make it mobile-friendly
                 meta_tags=[{'name': 'viewport',
                             'content': 'width=device-width, initial-scale=1.0'}])
 server = app.server
 
+if PUSH:
+    @server.before_request
+    def start_watcher_of_worker():
+        start_watcher()
+
+@server.after_request
+def set_session_cookie(response):
+    if SESSION_COOKIE not in request.cookies:
+        response.set_cookie(SESSION_COOKIE, uuid.uuid4().hex, httponly=True, samesite='Lax')
+    return response
+
 # LAYOUT SECTION: BOOTSTRAP
 #--------------------------------------------------------------------
+table_data, table_pages = initial_table()
+
 app.layout = html.Div([
-    dcc.Loading(
-        id='loading',
-        type='circle',
+    # every panel has its own loading spinner, see below
+    html.Div(
+        id='dashboard',
         children=[
             dbc.Container([
                 dbc.Row([
@@ -138,12 +1354,20 @@ app.layout = html.Div([
                         className='mt-1 d-flex align-items-end',),
                     dbc.Col(html.H3('For a deeper understanding of the video game industry and the factors that contribute to video game sales success', className='text-left d-flex align-items-center',
                         style={'font-family': 'Arial', 'font-size': '14px', 'color': '#006276',  'margin-bottom':'13px'}),
-                        width={'size': 7}),],
+                        width={'size': 7 if len(DATASETS) == 1 else 5}),
+                    # only shown when the deployment has more than one dataset
+                    dbc.Col(dcc.Dropdown(id='dd_dataset',
+                                         options=list(DATASETS),
+                                         value=DEFAULT_DATASET,
+                                         clearable=False),
+                        width={'size': 2},
+                        style={'font-size': '14px', 'margin-bottom': '10px',
+                               'display': 'none' if len(DATASETS) == 1 else 'block'}),],
                     className='mt-1 d-flex align-items-end',
                     style={'background-color': '#B7DEEF', 'height': '60px', 'border-radius': '2px'}),
                 dbc.Row([
                     dbc.Col(dcc.Dropdown(id='dd_platform',
-                                         options=sorted([{'label': i, 'value': i} for i in df['Platform'].unique()], key=lambda x: x['label']),
+                                         options=initial_options('Platform'),
                                          placeholder='select a platform',
                                          value=[],
                                          multi=True),
@@ -152,7 +1376,7 @@ app.layout = html.Div([
                             ),
 
                     dbc.Col(dcc.Dropdown(id='dd_company',
-                                         options=sorted([{'label': i, 'value': i} for i in df['Company'].unique()], key=lambda x: x['label']),
+                                         options=initial_options('Company'),
                                          placeholder='select a company',
                                          value=[],
                                          multi=True
@@ -162,7 +1386,7 @@ app.layout = html.Div([
                             ),
 
                     dbc.Col(dcc.Dropdown(id='dd_publisher',
-                                         options=sorted([{'label': i, 'value': i} for i in df['Publisher'].unique()], key=lambda x: x['label']),
+                                         options=[] if LAZY_LAYOUT else search_options(datasets.get(DEFAULT_DATASET).publisher_index, None),
                                          placeholder='select a publisher',
                                          value=[],
                                          multi=True
@@ -172,7 +1396,7 @@ app.layout = html.Div([
                             ),
 
                     dbc.Col(dcc.Dropdown(id='dd_genre',
-                                         options=sorted([{'label': i, 'value': i} for i in df['Genre'].unique()], key=lambda x: x['label']),
+                                         options=initial_options('Genre'),
                                          placeholder='select a genre',
                                          value=[],
                                          multi=True
@@ -182,7 +1406,7 @@ app.layout = html.Div([
                             ),
 
                     dbc.Col(dcc.Dropdown(id='dd_console',
-                                         options=sorted([{'label': i, 'value': i} for i in df['Console'].unique()], key=lambda x: x['label']),
+                                         options=initial_options('Console'),
                                          placeholder='select a console',
                                          value=[],
                                          multi=True
@@ -194,15 +1418,15 @@ app.layout = html.Div([
                 ),
                 dbc.Row(
                     dbc.Col(dcc.RangeSlider(id='slider_year',
-                                        min=df['Year'].min(),
-                                        max=df['Year'].max(),
+                                        min=year_range()[0],
+                                        max=year_range()[1],
                                         marks={1980: '1980',
                                                 1990: '1990',
                                                 2000: '2000',
                                                 2010: '2010',
                                                 2020: '2020'},
 
-                                        value=[df['Year'].min(), df['Year'].max()],
+                                        value=year_range(),
                                         updatemode='mouseup',
                                         ),
                     width={'size': 7,'offset':3},
@@ -210,18 +1434,29 @@ app.layout = html.Div([
                 html.Div(style={'height': '5px'}),
 
                 dbc.Row(html.Div(id='wrong_time_alert', children=[])),
+                # id of this page instance, filled in the browser, see page_id
+                dcc.Store(id='page_id'),
+                dcc.Store(id='exact_gauges'),
+                dcc.Store(id='exact_bar'),
+                dcc.Store(id='exact_line'),
+                # server push: the event stream clicks the hidden button, see push_update
+                dcc.Store(id='push_event'),
+                html.Button(id='push_button', style={'display': 'none'}),
                 dbc.Row([
                     dbc.Col([
                         dbc.Row(html.H5('Sales Ranking',
                                     className='text-left d-flex align-items-center', style={'background-color': '#B7DEEF', 'font-weight': 'bold', 'border-radius': '5px', 'height': '40px', 'weight': 'bold', 'color': '#006276'})),
-                        dbc.Row(dash_table.DataTable(
+                        dbc.Row(dcc.Loading(dash_table.DataTable(
                             id='datatable_1',
-                            columns=[{'name': i, 'id': i, 'deletable': False, 'selectable': True} for i in df_liste.columns],
-                            data=df_liste.to_dict('records'),
-                            sort_action='native',
-                            page_action='native',
+                            columns=[{'name': i, 'id': i, 'deletable': False, 'selectable': True} for i in TABLE_COLUMNS],
+                            # only the current page is sent, sorted and paged on the server
+                            data=table_data,
+                            sort_action='custom',
+                            sort_mode='single',
+                            page_action='custom',
                             page_current= 0,
-                            page_size= 17,
+                            page_count=table_pages,
+                            page_size= TABLE_PAGE_SIZE,
                             style_cell={'textAlign': 'left',
                                         'fontSize': '75%',
                                         'fontFamily': 'Arial, sans-serif',
@@ -233,13 +1468,17 @@ app.layout = html.Div([
                             style_as_list_view=True,
                             style_data_conditional=[
                                 {'if': {'row_index': 'odd'},'backgroundColor': '#F9FCFD'}],
-                ),
+                ), id='loading_table', type='circle'),
                         ),
+                        # all rows of the selection, streamed by /api/v1/export.csv
+                        dbc.Row(html.A('Download selection (CSV)', id='export_link',
+                                       href=export_url(DEFAULT_DATASET, year_range(), {}),
+                                       style={'font-size': '12px', 'color': '#006276'})),
                         ],
                         width={'size': 3},
                     ),
                     dbc.Col([
-                        dbc.Row(dcc.Graph(id='stable_diagram', figure={}),
+                        dbc.Row(dcc.Loading(dcc.Graph(id='stable_diagram', figure={}), id='loading_bar', type='circle'),
                              style={'height': '295px', 'margin-top': '0px','border-radius': '5px', 'backround-color':'white'}),
                         html.Div(style={'height': '7px', }),
 
@@ -256,7 +1495,7 @@ app.layout = html.Div([
                         ),
                         ),
                         html.Div(style={'height': '7px'}),
-                        dbc.Row(dcc.Graph(id='line_diagram', figure={}),
+                        dbc.Row(dcc.Loading(dcc.Graph(id='line_diagram', figure={}), id='loading_line', type='circle'),
                                 style={'height': '295px',
                     }
                                 ),
@@ -269,14 +1508,7 @@ app.layout = html.Div([
                         dbc.Row(html.H6(id='share_global', style={'text-align': 'center', 'font-size': '14px',}), className='mt-1 d-flex align-items-end',),
                         dbc.Col([
 
-                            dbc.Row(html.H6('North America', style={'text-align': 'center', 'font-size': '14px', }),className='mt-1 d-flex align-items-end',),
-                            dbc.Row(dcc.Graph(id='gauge_diagram_AM', figure={})),
-                            dbc.Row(html.H6('Europe', style={'text-align': 'center', 'font-size': '14px', }), className='mt-1 d-flex align-items-end',),
-                            dbc.Row(dcc.Graph(id='gauge_diagram_EUR', figure={})),
-                            dbc.Row(html.H6('Japan', style={'text-align': 'center', 'font-size': '14px', }),className='mt-1 d-flex align-items-end', ),
-                            dbc.Row(dcc.Graph(id='gauge_diagram_JAP', figure={})),
-                            dbc.Row(html.H6('Others', style={'text-align': 'center', 'font-size': '14px', }), className='mt-1 d-flex align-items-end',),
-                            dbc.Row(dcc.Graph(id='gauge_diagram_OTH', figure={})),
+                            dbc.Row(dcc.Loading(dcc.Graph(id='gauge_diagram', figure={}), id='loading_gauges', type='circle')),
                         ],style= {'background-color': 'white',}),
                     ],
                         width={'size': 2},
@@ -293,191 +1525,709 @@ app.layout = html.Div([
 
 # CALLBACK FUNCTION
 #--------------------------------------------------------------------
+# Every callback that can be superseded gets the id of its page as last argument (see page_id).
+page_state = State('page_id', 'data')
+
+# a new id for every page instance (the memory store starts empty on every load)
+app.clientside_callback(
+    'function (storage_type) { return Date.now().toString(36) + Math.random().toString(36).slice(2); }',
+    Output('page_id', 'data'),
+    Input('page_id', 'storage_type'),
+    prevent_initial_call=False)
+
 #The following callbacks are used to filter the dropdown menu options based on the selection of other dropdown filters.
+@cached_callback
+def compute_platform_options(dataset, company, publisher, genre, console, year):
+    store = datasets.get(dataset).store
+    positions = store.select(year, {'Console': console, 'Company': company, 'Publisher': publisher, 'Genre': genre})
+
+    options = [{'label': i, 'value': i} for i in store.values('Platform', positions)]
+    return options
+
 @app.callback(
     Output('dd_platform', 'options'),
+    Input('dd_dataset', 'value'),
     Input('dd_company', 'value'),
     Input('dd_publisher', 'value'),
     Input('dd_genre', 'value'),
     Input('dd_console', 'value'),
     Input('slider_year', 'value'),
+    page_state,
 )
-def update_platform_options(company, publisher, genre, console, year):
-    filtered_data = df
-    min_year, max_year = year
-    filtered_data = filtered_data[filtered_data['Year'].between(min_year, max_year)]
-
-    if console:
-        filtered_data = filtered_data[filtered_data['Console'].isin(console)]
-    if company:
-        filtered_data = filtered_data[filtered_data['Company'].isin(company)]
-    if publisher:
-        filtered_data = filtered_data[filtered_data['Publisher'].isin(publisher)]
-    if genre:
-        filtered_data = filtered_data[filtered_data['Genre'].isin(genre)]
-
-    options = sorted([{'label': i, 'value': i} for i in filtered_data['Platform'].unique()], key=lambda x: x['label'])
+def update_platform_options(dataset, company, publisher, genre, console, year, page=None):
+    return compute_platform_options(dataset, company, publisher, genre, console, year)
+
+@cached_callback
+def compute_company_options(dataset, platform, publisher, genre, console, year):
+    store = datasets.get(dataset).store
+    positions = store.select(year, {'Console': console, 'Platform': platform, 'Publisher': publisher, 'Genre': genre})
+
+    options = [{'label': i, 'value': i} for i in store.values('Company', positions)]
     return options
 
 @app.callback(
     Output('dd_company', 'options'),
+    Input('dd_dataset', 'value'),
     Input('dd_platform', 'value'),
     Input('dd_publisher', 'value'),
     Input('dd_genre', 'value'),
     Input('dd_console', 'value'),
     Input('slider_year', 'value'),
+    page_state,
 )
-def update_company_options(platform, publisher, genre, console, year):
-    filtered_data = df
-    min_year, max_year = year
-    filtered_data = filtered_data[filtered_data['Year'].between(min_year, max_year)]
-
-    if console:
-        filtered_data = filtered_data[filtered_data['Console'].isin(console)]
-    if platform:
-        filtered_data = filtered_data[filtered_data['Platform'].isin(platform)]
-    if publisher:
-        filtered_data = filtered_data[filtered_data['Publisher'].isin(publisher)]
-    if genre:
-        filtered_data = filtered_data[filtered_data['Genre'].isin(genre)]
-
-    options = sorted([{'label': i, 'value': i} for i in filtered_data['Company'].unique()], key=lambda x: x['label'])
+def update_company_options(dataset, platform, publisher, genre, console, year, page=None):
+    return compute_company_options(dataset, platform, publisher, genre, console, year)
+
+@cached_callback
+def compute_publisher_options(dataset, platform, company, genre, console, year, search_value, publisher):
+    store = datasets.get(dataset).store
+    positions = store.select(year, {'Console': console, 'Platform': platform, 'Company': company, 'Genre': genre})
+
+    # only the best selling matches of the search are sent to the browser
+    options = search_options(datasets.get(dataset).publisher_index, search_value, store.values('Publisher', positions), publisher)
     return options
 
 @app.callback(
     Output('dd_publisher', 'options'),
+    Input('dd_dataset', 'value'),
     Input('dd_platform', 'value'),
     Input('dd_company', 'value'),
     Input('dd_genre', 'value'),
     Input('dd_console', 'value'),
     Input('slider_year', 'value'),
+    Input('dd_publisher', 'search_value'),
+    State('dd_publisher', 'value'),
+    page_state,
 )
-def update_publisher_options(platform, company, genre, console, year):
-    filtered_data = df
-    min_year, max_year = year
-    filtered_data = filtered_data[filtered_data['Year'].between(min_year, max_year)]
-
-    if console:
-        filtered_data = filtered_data[filtered_data['Console'].isin(console)]
-    if platform:
-        filtered_data = filtered_data[filtered_data['Platform'].isin(platform)]
-    if company:
-        filtered_data = filtered_data[filtered_data['Company'].isin(company)]
-    if genre:
-        filtered_data = filtered_data[filtered_data['Genre'].isin(genre)]
-
-    options = sorted([{'label': i, 'value': i} for i in filtered_data['Publisher'].unique()], key=lambda x: x['label'])
+def update_publisher_options(dataset, platform, company, genre, console, year, search_value, publisher, page=None):
+    return compute_publisher_options(dataset, platform, company, genre, console, year, search_value, publisher)
+
+@cached_callback
+def compute_genre_options(dataset, platform, company, publisher, console, year):
+    store = datasets.get(dataset).store
+    positions = store.select(year, {'Console': console, 'Platform': platform, 'Company': company, 'Publisher': publisher})
+
+    options = [{'label': i, 'value': i} for i in store.values('Genre', positions)]
     return options
 
 @app.callback(
     Output('dd_genre', 'options'),
+    Input('dd_dataset', 'value'),
     Input('dd_platform', 'value'),
     Input('dd_company', 'value'),
     Input('dd_publisher', 'value'),
     Input('dd_console', 'value'),
-    Input('slider_year', 'value')
+    Input('slider_year', 'value'),
+    page_state,
 )
-def update_genre_options(platform, company, publisher, console, year):
-    filtered_data = df
-    min_year, max_year = year
-    filtered_data = filtered_data[filtered_data['Year'].between(min_year, max_year)]
-
-    if console:
-        filtered_data = filtered_data[filtered_data['Console'].isin(console)]
-    if platform:
-        filtered_data = filtered_data[filtered_data['Platform'].isin(platform)]
-    if company:
-        filtered_data = filtered_data[filtered_data['Company'].isin(company)]
-    if publisher:
-        filtered_data = filtered_data[filtered_data['Publisher'].isin(publisher)]
-
-    options = sorted([{'label': i, 'value': i} for i in filtered_data['Genre'].unique()], key=lambda x: x['label'])
+def update_genre_options(dataset, platform, company, publisher, console, year, page=None):
+    return compute_genre_options(dataset, platform, company, publisher, console, year)
+
+@cached_callback
+def compute_console_options(dataset, platform, company, publisher, genre, year):
+    store = datasets.get(dataset).store
+    positions = store.select(year, {'Publisher': publisher, 'Platform': platform, 'Company': company, 'Genre': genre})
+
+    options = [{'label': i, 'value': i} for i in store.values('Console', positions)]
     return options
 
 @app.callback(
     Output('dd_console', 'options'),
+    Input('dd_dataset', 'value'),
     Input('dd_platform', 'value'),
     Input('dd_company', 'value'),
     Input('dd_publisher', 'value'),
     Input('dd_genre', 'value'),
     Input('slider_year', 'value'),
+    page_state,
 )
-def update_console_options(platform, company, publisher, genre, year):
-    filtered_data = df
-    min_year, max_year = year
-    filtered_data = filtered_data[filtered_data['Year'].between(min_year, max_year)]
-
-    if publisher:
-        filtered_data = filtered_data[filtered_data['Publisher'].isin(publisher)]
-    if platform:
-        filtered_data = filtered_data[filtered_data['Platform'].isin(platform)]
-    if company:
-        filtered_data = filtered_data[filtered_data['Company'].isin(company)]
-    if genre:
-        filtered_data = filtered_data[filtered_data['Genre'].isin(genre)]
-
-    options = sorted([{'label': i, 'value': i} for i in filtered_data['Console'].unique()], key=lambda x: x['label'])
-    return options
+def update_console_options(dataset, platform, company, publisher, genre, year, page=None):
+    return compute_console_options(dataset, platform, company, publisher, genre, year)
+
+
+def select_rows(data, year, filters):
+    # the panels of one interaction are requested at the same time,
+    # they share one selection (computed once, kept for a short while)
+    state = (tuple(year), tuple((column, tuple(sorted(values or []))) for column, values in filters.items()))
+    # the selection only depends on the state, sessions with the same state share it
+    key = (data.version, state)
+    found, selection = selection_cache.get(key)
+    if not found:
+        selection = selection_flight.do(key, lambda: refine_selection(data, year, filters))
+        selection_cache.put(key, selection)
+    return selection
+
+def refine_selection(data, year, filters):
+    # starts from the previous selection of the session if the new filters only narrow it down
+    session = session_id()
+    state = (tuple(year), {column: sorted(values or []) for column, values in filters.items()})
+    previous = selection_store.get((data.version, session)) if session else None
+
+    if previous is not None and previous['state'] == state:
+        count('selection_reused')
+        return previous['rows'], previous['sales']
+    if previous is not None and is_refinement(state, previous['state']):
+        count('selection_refined')
+        positions = data.store.select(year, filters, previous['rows'])
+    else:
+        positions = data.store.select(year, filters)
+
+    sales = data.store.sales(positions)
+    if session:
+        selection_store.put((data.version, session), state, positions, sales)
+    return positions, sales
+
+def use_preview(dataset, year):
+    # estimated cost of the exact computation: rows of the time window
+    if APPROX_MODE == 'off':
+        return False
+    start, end = datasets.get(dataset).store.window(year)
+    return APPROX_MODE == 'on' or bool(end - start > APPROX_ROWS)
+
+def preview_selection(data, year, filters):
+    # rows of the weighted sample, the sales are estimates of the whole selection
+    sample_time, dff = filter_data(data.sample_df, year, filters)
+    return sample_time, dff
+
+def dropdown_filters(platform, genre, console, company, publisher):
+    return {'Platform': platform, 'Genre': genre, 'Console': console, 'Company': company, 'Publisher': publisher}
+
+# one function per panel, so every panel is shown as soon as its own result is ready
+@cached_callback
+def compute_gauges(dataset, platform, genre, console, company, publisher, year, preview=False):
+    data = datasets.get(dataset)
+    filters = dropdown_filters(platform, genre, console, company, publisher)
+    totals = window_totals(data.year_sales, year)
+
+    if preview:
+        sample_time, dff = preview_selection(data, year, filters)
+        shares = region_shares(region_sales(dff), totals)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            errors = dict(zip(REGIONS + ['Global'], np.round(estimate_errors(sample_time, dff.index) / totals * 100, 1).tolist()))
+        return calculate_global_share(shares, errors), gauge_chart(shares, errors), dash.no_update
+
+    positions, sales = select_rows(data, year, filters)
+    shares = region_shares(sales, totals)
+    return (calculate_global_share(shares),
+            gauge_chart(shares),
+            alert if len(positions) == 0 else dash.no_update)
+
+@cached_callback
+def compute_bar_chart(dataset, main_filter, platform, genre, console, company, publisher, year, preview=False):
+    data = datasets.get(dataset)
+    filters = dropdown_filters(platform, genre, console, company, publisher)
+    if preview:
+        sample = data.sample_store
+        return mark_preview(stacked_bar_chart_plotly(main_filter, sample.sum_by(main_filter, sample.select(year, filters))))
+
+    positions, _ = select_rows(data, year, filters)
+    check_superseded()
+    return stacked_bar_chart_plotly(main_filter, data.store.sum_by(main_filter, positions))
+
+@cached_callback
+def compute_line_chart(dataset, main_filter, platform, genre, console, company, publisher, year, preview=False):
+    data = datasets.get(dataset)
+    filters = dropdown_filters(platform, genre, console, company, publisher)
+    if preview:
+        sample = data.sample_store
+        return mark_preview(line_diagram(main_filter, sample.sum_by_year(main_filter, sample.select(year, filters))))
+
+    positions, _ = select_rows(data, year, filters)
+    check_superseded()
+    return line_diagram(main_filter, data.store.sum_by_year(main_filter, positions))
+
+@cached_callback
+def compute_table(dataset, platform, genre, console, company, publisher, year, page=0, sort_column=None, descending=False):
+    # one page of the selection and the number of pages
+    data = datasets.get(dataset)
+    positions, _ = select_rows(data, year, dropdown_filters(platform, genre, console, company, publisher))
+    check_superseded()
+    return (data.store.page(positions, page, TABLE_PAGE_SIZE, sort_column, descending),
+            max(1, -(-len(positions) // TABLE_PAGE_SIZE)))
+
+def exact_is_cached(name, args):
+    return result_cache.get(cache_key(name, list(args) + [False]))[0]
+
+def wants_preview(name, args, year):
+    # a preview first if the exact result is expensive and not cached yet,
+    # the exact result follows through the exact_* store of the panel
+    return use_preview(args[0], year) and not exact_is_cached(name, args)
+
+dropdown_inputs = [Input('dd_dataset', 'value'),
+                   Input('dd_platform', 'value'),
+                   Input('dd_genre', 'value'),
+                   Input('dd_console', 'value'),
+                   Input('dd_company', 'value'),
+                   Input('dd_publisher', 'value'),
+                   Input('slider_year', 'value')]
 
+# another dataset starts without filters and with all of its years
+@app.callback(
+    [Output('dd_platform', 'value'),
+     Output('dd_genre', 'value'),
+     Output('dd_console', 'value'),
+     Output('dd_company', 'value'),
+     Output('dd_publisher', 'value'),
+     Output('slider_year', 'min'),
+     Output('slider_year', 'max'),
+     Output('slider_year', 'value'),
+     ],
+    Input('dd_dataset', 'value'),
+    prevent_initial_call=True)
+def switch_dataset(dataset):
+    years = year_range(dataset)
+    return [], [], [], [], [], years[0], years[1], years
+
+def default_state(dataset):
+    # the outputs of all callbacks for the state every page starts with, by component id
+    year = year_range(dataset)
+    none = [[], [], [], [], []]
+    share, gauges, alert_children = compute_gauges(dataset, *none, year, False)
+    table, page_count = compute_table(dataset, *none, year, 0, None, False)
+    return {
+        'dd_platform': {'options': compute_platform_options(dataset, *none[:4], year)},
+        'dd_company': {'options': compute_company_options(dataset, *none[:4], year)},
+        'dd_publisher': {'options': compute_publisher_options(dataset, *none[:4], year, None, [])},
+        'dd_genre': {'options': compute_genre_options(dataset, *none[:4], year)},
+        'dd_console': {'options': compute_console_options(dataset, *none[:4], year)},
+        'slider_year': {'min': year[0], 'max': year[1], 'value': year},
+        'share_global': {'children': share},
+        'gauge_diagram': {'figure': gauges},
+        'wrong_time_alert': {'children': [] if isinstance(alert_children, NoUpdate) else alert_children},
+        'stable_diagram': {'figure': compute_bar_chart(dataset, 'Platform', *none, year, False)},
+        'line_diagram': {'figure': compute_line_chart(dataset, 'Platform', *none, year, False)},
+        'datatable_1': {'data': table, 'page_count': page_count, 'page_current': 0},
+        'export_link': {'href': export_url(dataset, year, {})},
+    }
+
+def fill_layout(layout, state):
+    for component_id, props in state.items():
+        for prop, value in props.items():
+            # no_update (also an unpickled copy of it) keeps the value of the layout
+            if not isinstance(value, NoUpdate):
+                setattr(layout[component_id], prop, value)
+
+# now the callbacks for the diagramm updates, the cheapest panel first
+@app.callback(
+    [Output('share_global', 'children'),
+    Output('gauge_diagram', 'figure'),
+    Output('wrong_time_alert', 'children'),
+    Output('exact_gauges', 'data'),
+     ],
+    dropdown_inputs + [page_state],)
+def update_gauges(dataset, platform, genre, console, company, publisher, year, page=None):
+    args = [dataset, platform, genre, console, company, publisher, year]
+    if wants_preview('compute_gauges', args, year):
+        return compute_gauges(*args, True) + (args,)
+    return compute_gauges(*args, False) + (dash.no_update,)
 
-# now the callback for the diagramm updates
 @app.callback(
-    [Output('datatable_1', 'data'),
     Output('stable_diagram', 'figure'),
+    Output('exact_bar', 'data'),
+    dropdown_inputs[:1] + [Input('check_choice', 'value')] + dropdown_inputs[1:] + [page_state],)
+def update_bar_chart(dataset, main_filter, platform, genre, console, company, publisher, year, page=None):
+    args = [dataset, main_filter, platform, genre, console, company, publisher, year]
+    if wants_preview('compute_bar_chart', args, year):
+        return compute_bar_chart(*args, True), args
+    return compute_bar_chart(*args, False), dash.no_update
+
+@app.callback(
     Output('line_diagram', 'figure'),
-    Output('share_global', 'children'),
-    Output('gauge_diagram_AM', 'figure'),
-    Output('gauge_diagram_EUR', 'figure'),
-    Output('gauge_diagram_JAP', 'figure'),
-    Output('gauge_diagram_OTH', 'figure'),
-    Output('wrong_time_alert', 'children')
+    Output('exact_line', 'data'),
+    dropdown_inputs[:1] + [Input('check_choice', 'value')] + dropdown_inputs[1:] + [page_state],)
+def update_line_chart(dataset, main_filter, platform, genre, console, company, publisher, year, page=None):
+    args = [dataset, main_filter, platform, genre, console, company, publisher, year]
+    if wants_preview('compute_line_chart', args, year):
+        return compute_line_chart(*args, True), args
+    return compute_line_chart(*args, False), dash.no_update
+
+@app.callback(
+    Output('datatable_1', 'data'),
+    Output('datatable_1', 'page_count'),
+    Output('datatable_1', 'page_current'),
+    dropdown_inputs + [Input('datatable_1', 'page_current'),
+                       Input('datatable_1', 'sort_by'), page_state],)
+def update_table(dataset, platform, genre, console, company, publisher, year, page_current=0, sort_by=None, page=None):
+    # a new selection starts on the first page (no callback context when called directly)
+    if flask.has_request_context() and dash.callback_context.triggered_id not in (None, 'datatable_1'):
+        page_current = 0
+    page_current = page_current or 0
+    sort_column = sort_by[0]['column_id'] if sort_by else None
+    descending = bool(sort_by) and sort_by[0]['direction'] == 'desc'
+    data, page_count = compute_table(dataset, platform, genre, console, company, publisher, year, page_current, sort_column, descending)
+    return data, page_count, page_current
+
+@app.callback(
+    Output('export_link', 'href'),
+    dropdown_inputs,)
+def update_export_link(dataset, platform, genre, console, company, publisher, year):
+    return export_url(dataset, year, dropdown_filters(platform, genre, console, company, publisher))
+
+# exact results after a preview, again one callback per panel
+@app.callback(
+    [Output('share_global', 'children', allow_duplicate=True),
+    Output('gauge_diagram', 'figure', allow_duplicate=True),
+    Output('wrong_time_alert', 'children', allow_duplicate=True),
      ],
-    [Input('check_choice', 'value'),
-    Input('dd_platform', 'value'),
-    Input('dd_genre', 'value'),
-    Input('dd_console', 'value'),
-    Input('dd_company', 'value'),
-    Input('dd_publisher', 'value'),
-    Input('slider_year', 'value')
-     ],)
+    Input('exact_gauges', 'data'),
+    page_state,
+    prevent_initial_call=True)
+def update_gauges_exact(args, page=None):
+    if not args:
+        raise PreventUpdate
+    return compute_gauges(*args, False)
 
-def update_charts(main_filter, platform, genre, console, company, publisher, year):
-    min_year, max_year = year
-    dfc = df.copy()
-    dft = dfc[dfc['Year'].between(min_year, max_year)]
-    dff = dft
-
-    if platform:
-        dff = dff[dff['Platform'].isin(platform)]
-    if genre:
-        dff = dff[dff['Genre'].isin(genre)]
-    if console:
-        dff = dff[dff['Console'].isin(console)]
-    if company:
-        dff = dff[dff['Company'].isin(company)]
-    if publisher:
-        dff = dff[dff['Publisher'].isin(publisher)]
-
-    if len(dff) == 0:
-        return (dff.to_dict('records'),
-               stacked_bar_chart_plotly(main_filter,dff),
-               line_diagram(main_filter,dff),
-               calculate_global_share(main_filter, dff, dft),
-               gauge_chart(main_filter, dff, 'North America', dft),
-               gauge_chart(main_filter, dff, 'Europe', dft),
-               gauge_chart(main_filter, dff, 'Japan', dft),
-               gauge_chart(main_filter, dff, 'Others', dft),
-                alert)
-    else:
-        return (dff.to_dict('records'),
-               stacked_bar_chart_plotly(main_filter,dff),
-               line_diagram(main_filter,dff),
-               calculate_global_share(main_filter, dff, dft),
-               gauge_chart(main_filter, dff, 'North America', dft),
-               gauge_chart(main_filter, dff, 'Europe', dft),
-               gauge_chart(main_filter, dff, 'Japan', dft),
-               gauge_chart(main_filter, dff, 'Others', dft),
-               dash.no_update)
+@app.callback(
+    Output('stable_diagram', 'figure', allow_duplicate=True),
+    Input('exact_bar', 'data'),
+    page_state,
+    prevent_initial_call=True)
+def update_bar_chart_exact(args, page=None):
+    if not args:
+        raise PreventUpdate
+    return compute_bar_chart(*args, False)
+
+@app.callback(
+    Output('line_diagram', 'figure', allow_duplicate=True),
+    Input('exact_line', 'data'),
+    page_state,
+    prevent_initial_call=True)
+def update_line_chart_exact(args, page=None):
+    if not args:
+        raise PreventUpdate
+    return compute_line_chart(*args, False)
+
+# server push: new dataset versions arrive as server-sent events (/api/v1/events). The first call
+# opens the stream, every event clicks the hidden push_button and is handed to push_update.
+PUSH_CLIENT = '''
+function (n_clicks) {
+    if (!window.dashboardPush) {
+        window.dashboardPush = {event: null};
+        var source = new EventSource(%s);
+        source.addEventListener('version', function (message) {
+            window.dashboardPush.event = JSON.parse(message.data);
+            document.getElementById('push_button').click();
+        });
+        return window.dash_clientside.no_update;
+    }
+    return window.dashboardPush.event;
+}
+'''
+
+def figure_patch(old, new):
+    # the trace properties that changed, None when more than that changed (traces or layout)
+    old, new = old.to_plotly_json(), new.to_plotly_json()
+    if len(old['data']) != len(new['data']) or to_json(old['layout']) != to_json(new['layout']):
+        return None
+    patch = dash.Patch()
+    for i, (old_trace, new_trace) in enumerate(zip(old['data'], new['data'])):
+        if old_trace.keys() != new_trace.keys():
+            return None
+        for key, value in new_trace.items():
+            if to_json(old_trace[key]) != to_json(value):
+                patch['data'][i][key] = value
+    return patch
+
+def pushed_value(old, new):
+    # what the browser needs of a new result: nothing, a patch of the figure or all of it
+    # (old is None when the result of the previous version is no longer cached)
+    if old is None:
+        return new
+    if to_json(old) == to_json(new):
+        return dash.no_update
+    patch = figure_patch(old, new) if isinstance(new, go.Figure) else None
+    return new if patch is None else patch
+
+def pushed_results(name, args, previous):
+    # result of a cached callback for the new version and for the previous one
+    new = cached_callbacks[name](*args)
+    found, old = result_cache.get((previous, name, canonical_args(args)))
+    return (old if found else None), new
+
+if PUSH:
+    app.clientside_callback(
+        PUSH_CLIENT % json.dumps(app.get_relative_path('/api/v1/events')),
+        Output('push_event', 'data'),
+        Input('push_button', 'n_clicks'),
+        prevent_initial_call=False)
+
+    @app.callback(
+        [Output('share_global', 'children', allow_duplicate=True),
+         Output('gauge_diagram', 'figure', allow_duplicate=True),
+         Output('stable_diagram', 'figure', allow_duplicate=True),
+         Output('line_diagram', 'figure', allow_duplicate=True),
+         Output('datatable_1', 'data', allow_duplicate=True),
+         Output('datatable_1', 'page_count', allow_duplicate=True),
+         ],
+        Input('push_event', 'data'),
+        [State(i.component_id, i.component_property) for i in dropdown_inputs[:1] + [Input('check_choice', 'value')] + dropdown_inputs[1:]]
+        + [State('datatable_1', 'page_current'), State('datatable_1', 'sort_by')],
+        prevent_initial_call=True)
+    def push_update(event, dataset, main_filter, platform, genre, console, company, publisher, year, page_current, sort_by):
+        # only the panels whose numbers changed are sent, figures as patches of the changed traces
+        if not event or event['dataset'] != dataset:
+            raise PreventUpdate
+        # this worker may not have noticed the change yet
+        check_dataset(dataset)
+        count('push_updates')
+        filters = [platform, genre, console, company, publisher]
+        sort_column = sort_by[0]['column_id'] if sort_by else None
+        descending = bool(sort_by) and sort_by[0]['direction'] == 'desc'
+
+        old_gauges, new_gauges = pushed_results('compute_gauges', [dataset, *filters, year, False], event['previous'])
+        old_bar, new_bar = pushed_results('compute_bar_chart', [dataset, main_filter, *filters, year, False], event['previous'])
+        old_line, new_line = pushed_results('compute_line_chart', [dataset, main_filter, *filters, year, False], event['previous'])
+        old_table, new_table = pushed_results('compute_table', [dataset, *filters, year, page_current or 0, sort_column, descending], event['previous'])
+        old_gauges, old_table = old_gauges or (None, None, None), old_table or (None, None)
+        return (pushed_value(old_gauges[0], new_gauges[0]), pushed_value(old_gauges[1], new_gauges[1]),
+                pushed_value(old_bar, new_bar), pushed_value(old_line, new_line),
+                pushed_value(old_table[0], new_table[0]), pushed_value(old_table[1], new_table[1]))
+
+
+# API SECTION
+#--------------------------------------------------------------------
+# The numbers behind the charts as JSON, see README.md for the parameters.
+def parse_filter_spec(args):
+    dataset = args.get('dataset', DEFAULT_DATASET)
+    if dataset not in DATASETS:
+        raise ValueError(f'dataset must be one of {list(DATASETS)}')
+
+    main_filter = args.get('main_filter', 'Platform')
+    if main_filter not in FILTERS:
+        raise ValueError(f'main_filter must be one of {FILTERS}')
+
+    years = year_range(dataset)
+    year = [int(args.get('year_min', years[0])), int(args.get('year_max', years[1]))]
+    if year[0] > year[1]:
+        raise ValueError('year_min must not be greater than year_max')
+
+    # sorted and without duplicates, so equal filters give the same query
+    filters = {column: sorted(set(args.getlist(column.lower()))) for column in FILTERS}
+    return dataset, main_filter, year, filters
+
+def canonical_query(dataset, main_filter, year, filters):
+    query = {'dataset': dataset, 'main_filter': main_filter, 'year': year, 'filters': filters}
+    return json.dumps(query, sort_keys=True, separators=(',', ':'))
+
+def aggregate_payload(data, main_filter, year, filters):
+    store = data.store
+    positions = store.select(year, filters)
+    regions = dict(zip(REGIONS + ['Global'], store.sales(positions)))
+    by_filter = store.sum_by(main_filter, positions)
+    by_year = store.sum_by_year(main_filter, positions)
+    return {
+        'regions': {region: round(float(regions[region]), 2) for region in REGIONS + ['Global']},
+        'shares': {region: None if np.isnan(share) else share for region, share in region_shares(store.sales(positions), window_totals(data.year_sales, year)).items()},
+        'by_filter': by_filter.round(2).to_dict('records'),
+        'years': by_year.round(2).to_dict('records'),
+        'options': facet_options(store, year, filters),
+    }
+
+@server.route('/api/v1/aggregate')
+def api_aggregate():
+    try:
+        dataset, main_filter, year, filters = parse_filter_spec(request.args)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    # strong ETag: same data version and same query give the same answer
+    data = datasets.get(dataset)
+    query = canonical_query(dataset, main_filter, year, filters)
+    etag = hashlib.sha1(f'{data.version}:{query}'.encode()).hexdigest()
+    if etag in request.if_none_match:
+        return server.response_class(status=304, headers={'ETag': f'"{etag}"'})
+
+    response = jsonify({'dataset_version': data.version,
+                        'query': json.loads(query),
+                        **aggregate_payload(data, main_filter, year, filters)})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# columns of the csv export, rows in the order of the dataset (by year)
+EXPORT_COLUMNS = ['Rank', 'Name', 'Year', 'Platform', 'Company', 'Console', 'Genre', 'Publisher'] + REGIONS + ['Global']
+EXPORT_CHUNK_ROWS = 100_000
+
+def export_rows(data, year, filters, chunk_rows=EXPORT_CHUNK_ROWS):
+    # csv text piece by piece: every piece is selected from at most chunk_rows rows,
+    # so the memory of a download does not grow with the selection
+    yield data.store.frame(np.arange(0), EXPORT_COLUMNS).to_csv(index=False)
+    for positions in data.store.select_chunks(year, filters, chunk_rows):
+        if len(positions):
+            count('export_rows', len(positions))
+            yield data.store.frame(positions, EXPORT_COLUMNS).to_csv(index=False, header=False)
+
+@server.route('/api/v1/export.csv')
+def api_export():
+    try:
+        dataset, _, year, filters = parse_filter_spec(request.args)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    count('exports')
+    filename = f'{dataset}_{year[0]}-{year[1]}.csv'
+    return server.response_class(export_rows(datasets.get(dataset), year, filters), mimetype='text/csv',
+                                 headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+def event_id():
+    # the versions the browser knows, it sends them back as Last-Event-ID when it reconnects
+    return urlencode({name: info['version'] for name, info in datasets.info()['loaded'].items()})
+
+def server_event(event):
+    return f'id: {event_id()}\nevent: version\ndata: {json.dumps(event)}\n\n'
+
+def event_stream(events, known):
+    yield f'retry: {PUSH_RETRY_MS}\nid: {event_id()}\n\n'
+    # changes the browser missed while it was reconnecting
+    for name, version in known.items():
+        data = datasets.loaded_dataset(name)
+        if data is not None and data.version != version:
+            yield server_event({'dataset': name, 'version': data.version, 'previous': version})
+    deadline = time.time() + PUSH_STREAM_SECONDS
+    while time.time() < deadline:
+        try:
+            event = events.get(timeout=PUSH_KEEPALIVE_SECONDS)
+        except queue.Empty:
+            # a comment, so a closed connection is noticed
+            yield ': keep-alive\n\n'
+            continue
+        count('push_events')
+        yield server_event(event)
+
+@server.route('/api/v1/events')
+def api_events():
+    # server-sent events: the new version of a dataset whenever its file changes
+    if not PUSH:
+        return jsonify({'error': 'push is off (DASHBOARD_PUSH=1)'}), 404
+    known = {name: version for name, version in parse_qsl(request.headers.get('Last-Event-ID', ''))
+             if name in DATASETS}
+    for name in known:
+        check_dataset(name)
+    events = push_hub.subscribe()
+    if events is None:
+        # an EventSource gives up on an error status, an empty stream makes it reconnect later
+        # (after a random delay, so the rejected browsers do not come back all at once)
+        count('push_rejected')
+        retry = random.randint(PUSH_RETRY_MS, 2 * PUSH_RETRY_MS)
+        return server.response_class(f'retry: {retry}\n\n', mimetype='text/event-stream',
+                                     headers={'Cache-Control': 'no-cache'})
+    response = server.response_class(event_stream(events, known), mimetype='text/event-stream',
+                                     headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(lambda: push_hub.unsubscribe(events))
+    return response
+
+
+@server.route('/api/v1/metrics')
+def api_metrics():
+    # counters of the worker that answers the request
+    with metrics_lock:
+        values = dict(metrics)
+    return jsonify({'pid': os.getpid(), 'datasets': datasets.info(),
+                    'cache_entries': len(result_cache.entries), 'counters': values})
+
+
+# DEBUG SECTION
+#--------------------------------------------------------------------
+# Opt-in (DASHBOARD_DEBUG_ENDPOINTS=1) memory profiling of a live worker with tracemalloc.
+# The counters are global to the worker, with several threads the peak of a request
+# can include allocations of requests running at the same time.
+def callback_name():
+    # name of the dash callback a request is for, otherwise the flask endpoint
+    if request.path.endswith('_dash-update-component'):
+        body = request.get_json(silent=True) or {}
+        callback = app.callback_map.get(body.get('output'), {}).get('callback')
+        if callback is not None:
+            return callback.__name__
+    return request.endpoint or request.path
+
+def callback_lines():
+    # line ranges of the callbacks in this file, to find the callback of a traceback
+    ranges = []
+    for entry in app.callback_map.values():
+        # clientside callbacks have no python function
+        if entry.get('callback') is None:
+            continue
+        func = inspect.unwrap(entry['callback'])
+        lines, start = inspect.getsourcelines(func)
+        ranges.append((start, start + len(lines), func.__name__))
+    return ranges
+
+def allocations_by_callback(snapshot, limit):
+    ranges = callback_lines()
+    this_file = os.path.abspath(__file__)
+    groups = {}
+    for stat in snapshot.statistics('traceback'):
+        # frames from the oldest to the most recent call
+        frames = [frame for frame in stat.traceback if os.path.abspath(frame.filename) == this_file]
+        # the outermost frame of this file that lies in a callback names the group
+        group = 'other'
+        for frame in frames:
+            names = [name for start, end, name in ranges if start <= frame.lineno < end]
+            if names:
+                group = names[0]
+                break
+        # the site is the innermost line of this file (or of any file)
+        site = frames[-1] if frames else stat.traceback[-1]
+        entry = groups.setdefault(group, {'size': 0, 'count': 0, 'sites': Counter()})
+        entry['size'] += stat.size
+        entry['count'] += stat.count
+        entry['sites'][f'{site.filename}:{site.lineno}'] += stat.size
+
+    return {group: {'size': entry['size'], 'count': entry['count'],
+                    'top': [{'site': site, 'size': size} for site, size in entry['sites'].most_common(limit)]}
+            for group, entry in sorted(groups.items(), key=lambda item: item[1]['size'], reverse=True)}
+
+if os.environ.get('DASHBOARD_DEBUG_ENDPOINTS') == '1':
+    @server.route('/debug/tracemalloc/start')
+    def debug_tracemalloc_start():
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(int(request.args.get('frames', 32)))
+        return jsonify({'pid': os.getpid(), 'tracing': True})
+
+    @server.route('/debug/tracemalloc/stop')
+    def debug_tracemalloc_stop():
+        tracemalloc.stop()
+        return jsonify({'pid': os.getpid(), 'tracing': False})
+
+    @server.route('/debug/tracemalloc/snapshot')
+    def debug_tracemalloc_snapshot():
+        if not tracemalloc.is_tracing():
+            return jsonify({'error': 'tracemalloc is not running, call /debug/tracemalloc/start first'}), 409
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        return jsonify({'pid': os.getpid(), 'traced_current': current, 'traced_peak': peak,
+                        'callbacks': allocations_by_callback(snapshot, int(request.args.get('limit', 10)))})
+
+    @server.before_request
+    def reset_memory_peak():
+        if tracemalloc.is_tracing():
+            flask.g.memory_start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+    @server.after_request
+    def record_memory_peak(response):
+        if tracemalloc.is_tracing() and 'memory_start' in flask.g:
+            name = callback_name()
+            peak = tracemalloc.get_traced_memory()[1] - flask.g.memory_start
+            count(f'memory_peak_bytes_total:{name}', peak)
+            count(f'memory_peak_requests:{name}')
+            count_max(f'memory_peak_bytes_max:{name}', peak)
+        return response
+
+
+# WARM UP
+#--------------------------------------------------------------------
+# With gunicorn --preload this runs once in the master process and
+# all workers start with the warm cache.
+if access_log.path:
+    warm_cache()
+    atexit.register(access_log.flush)
+
+# the layout with the default state
+if SNAPSHOT:
+    app.serialized_layout()
 
 
 # RUN THE APP
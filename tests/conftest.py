@@ -0,0 +1,10 @@
+# settings of main for all tests, they are read when main is imported:
+# no access log in the working directory, the memory profiling endpoints on.
+# The repository root is importable (main), also when pytest is started without python -m.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('DASHBOARD_ACCESS_LOG', '')
+os.environ.setdefault('DASHBOARD_DEBUG_ENDPOINTS', '1')
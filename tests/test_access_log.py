@@ -0,0 +1,39 @@
+# ACCESS LOG AND SHARED FILES WITHOUT FCNTL
+#-------------------------------------------------------------------
+# Run from the repository root: python -m pytest tests
+# The access log is on by default, it is written with file locks where fcntl exists and
+# without them elsewhere (Windows).
+import os
+
+os.environ.setdefault('DASHBOARD_ACCESS_LOG', '')
+
+import pytest
+
+import main
+
+@pytest.fixture(params=['fcntl', 'no fcntl'])
+def locks(request, monkeypatch):
+    if request.param == 'no fcntl':
+        monkeypatch.setattr(main, 'fcntl', None)
+    return request.param
+
+def test_flush_and_load(tmp_path, locks):
+    log = main.AccessLog(str(tmp_path / 'access_log.json'))
+    log.record('compute_bar_chart', ['videogames', 'Platform'])
+    log.record('compute_bar_chart', ['videogames', 'Platform'])
+    log.record('compute_line_chart', ['videogames', 'Genre'])
+    log.flush()
+    assert not log.pending
+    assert log.hottest(1) == [['compute_bar_chart', ['videogames', 'Platform']]]
+    # a second worker (or run) adds its counts to the file
+    other = main.AccessLog(log.path)
+    other.record('compute_line_chart', ['videogames', 'Genre'])
+    other.record('compute_line_chart', ['videogames', 'Genre'])
+    other.flush()
+    assert log.hottest(1) == [['compute_line_chart', ['videogames', 'Genre']]]
+
+def test_shared_single_flight(tmp_path, locks):
+    flight = main.SingleFlight(shared_dir=str(tmp_path))
+    assert flight.do('key', lambda: 42) == 42
+    # the second call reads the result file of the first
+    assert flight.do('key', lambda: 0) == 42
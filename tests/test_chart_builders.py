@@ -0,0 +1,51 @@
+# FIGURES OF THE CHART BUILDERS
+#-------------------------------------------------------------------
+# Run from the repository root: python -m pytest tests
+# The bar and line figures built from the px templates (stacked_bar_chart_plotly, line_diagram)
+# serialize exactly like the ones of plotly express (px_stacked_bar_chart, px_line_diagram):
+# 48 selections x 5 main filters x 2 charts = 480 figures.
+import json
+import os
+
+os.environ.setdefault('DASHBOARD_ACCESS_LOG', '')
+
+import numpy as np
+import pytest
+from dash._utils import to_json
+
+import main
+
+SELECTIONS = [([1980, 2020], {}), ([2005, 2010], {}), ([1980, 2020], {'Genre': ['Action']}),
+              ([2005, 2015], {'Platform': ['Wii'], 'Genre': ['Sports']}), ([2008, 2008], {}),
+              ([2008, 2008], {'Platform': ['Wii']}), ([1980, 1980], {'Platform': ['PS4']}), ([2019, 2020], {})]
+
+def selections(store, count=40, seed=0):
+    yield from SELECTIONS
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        first = int(rng.integers(1980, 2021))
+        column = str(rng.choice(main.FILTERS))
+        yield [first, int(rng.integers(first, 2021))], {column: list(rng.choice(store.categories[column], int(rng.integers(1, 4))))}
+
+@pytest.fixture(scope='module')
+def store():
+    return main.datasets.get(main.DEFAULT_DATASET).store
+
+def test_figures_match_plotly_express(store):
+    builders = [(main.stacked_bar_chart_plotly, main.px_stacked_bar_chart, store.sum_by),
+                (main.line_diagram, main.px_line_diagram, store.sum_by_year)]
+    figures = 0
+    for year, filters in selections(store):
+        positions = store.select(year, filters)
+        for main_filter in main.FILTERS:
+            for build, reference, aggregate in builders:
+                grouped = aggregate(main_filter, positions)
+                figure = build(main_filter, grouped)
+                assert json.loads(to_json(figure)) == json.loads(to_json(reference(main_filter, grouped))), \
+                    (build.__name__, main_filter, year, filters)
+                # marking a preview changes the figure, not the template it was built from
+                main.mark_preview(figure)
+                figures += 1
+    assert figures == 480
+    figure = main.stacked_bar_chart_plotly('Genre', store.sum_by('Genre', store.select([1980, 2020], {})))
+    assert 'title' not in json.loads(to_json(figure))['layout']
@@ -0,0 +1,70 @@
+# SELECTIONS OF THE COLUMN STORE
+#-------------------------------------------------------------------
+# Run from the repository root: python -m pytest tests
+# Row positions, sales, options and aggregations of ColumnStore are the ones of the pandas
+# filter path (filter_data, aggregate_by_filter, aggregate_by_year) on 300 random filter states,
+# also when a selection is refined from the previous one of a session.
+import os
+
+os.environ.setdefault('DASHBOARD_ACCESS_LOG', '')
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+STATES = 300
+
+def random_states(store, count, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        first = int(rng.integers(store.years[0], store.years[-1] + 1))
+        year = [first, int(rng.integers(first, store.years[-1] + 1))]
+        filters = {column: [] for column in main.FILTERS}
+        for column in rng.choice(main.FILTERS, rng.integers(0, 3), replace=False):
+            filters[column] = list(rng.choice(store.categories[column], rng.integers(1, 4), replace=False))
+        yield year, filters
+
+@pytest.fixture(scope='module')
+def data():
+    return main.datasets.get(main.DEFAULT_DATASET)
+
+def test_positions_match_filter_data(data):
+    store = data.store
+    for year, filters in random_states(store, STATES):
+        _, dff = main.filter_data(data.df, year, filters)
+        positions = store.select(year, filters)
+        np.testing.assert_array_equal(positions, data.df.index.get_indexer(dff.index))
+        np.testing.assert_allclose(store.sales(positions), dff[main.REGIONS + ['Global']].sum().to_numpy(), atol=1e-6)
+        for column in main.FILTERS:
+            assert store.values(column, positions).tolist() == sorted(dff[column].unique())
+
+def test_refined_selection_matches(data):
+    # a narrower state computed from the previous selection (as refine_selection does)
+    store = data.store
+    for (year, filters), (_, extra) in zip(random_states(store, STATES), random_states(store, STATES, seed=1)):
+        previous = store.select(year, filters)
+        narrower = {column: values or extra[column] for column, values in filters.items()}
+        narrower_year = [year[0], max(year[0], year[1] - 1)]
+        state = (tuple(narrower_year), narrower)
+        assert main.is_refinement(state, (tuple(year), filters))
+        np.testing.assert_array_equal(store.select(narrower_year, narrower, previous), store.select(narrower_year, narrower))
+
+def test_aggregations_match_pandas(data):
+    store = data.store
+    for year, filters in random_states(store, STATES // 10, seed=2):
+        positions = store.select(year, filters)
+        _, dff = main.filter_data(data.df, year, filters)
+        for column in main.FILTERS:
+            grouped = store.sum_by(column, positions)
+            # best selling first; pandas orders equal sales differently (unstable sort)
+            assert (np.diff(grouped['Global'].to_numpy()) <= 1e-9).all()
+            expected = main.aggregate_by_filter(column, dff).sort_values(column, ignore_index=True)
+            grouped = grouped.sort_values(column, ignore_index=True)
+            assert grouped[column].tolist() == expected[column].tolist()
+            np.testing.assert_allclose(grouped[main.REGIONS + ['Global']].to_numpy(),
+                                       expected[main.REGIONS + ['Global']].to_numpy(), atol=1e-6)
+            by_year = main.aggregate_by_year(column, dff)
+            pd.testing.assert_frame_equal(store.sum_by_year(column, positions).reset_index(drop=True),
+                                          by_year.reset_index(drop=True), check_dtype=False, atol=1e-6)
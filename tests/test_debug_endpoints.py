@@ -0,0 +1,42 @@
+# MEMORY PROFILING ENDPOINTS
+#-------------------------------------------------------------------
+# Run from the repository root: python -m pytest tests
+# start -> one callback request -> snapshot -> stop, with all callbacks of the app registered
+# (clientside ones included).
+import main
+
+def callback_body(output):
+    # request of the callback with this output, the inputs and states with their layout values
+    props = {}
+    def walk(node):
+        if isinstance(node, dict) and 'props' in node:
+            if isinstance(node['props'].get('id'), str):
+                props[node['props']['id']] = node['props']
+            for value in node['props'].values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+    client = main.server.test_client()
+    walk(client.get('/_dash-layout').get_json())
+    dependency = next(d for d in client.get('/_dash-dependencies').get_json() if d['output'] == output)
+    outputs = [{'id': o.rsplit('.', 1)[0], 'property': o.rsplit('.', 1)[1]} for o in output.strip('.').split('...')]
+    body = {'output': output, 'outputs': outputs if len(outputs) > 1 else outputs[0], 'changedPropIds': []}
+    for kind in ('inputs', 'state'):
+        body[kind] = [{'id': i['id'], 'property': i['property'], 'value': props.get(i['id'], {}).get(i['property'])}
+                      for i in dependency[kind]]
+    return body
+
+def test_tracemalloc_snapshot():
+    client = main.server.test_client()
+    body = callback_body('..stable_diagram.figure...exact_bar.data..')
+    assert client.get('/debug/tracemalloc/start?frames=8').status_code == 200
+    try:
+        assert client.post('/_dash-update-component', json=body).status_code in (200, 204)
+        response = client.get('/debug/tracemalloc/snapshot?limit=3')
+        assert response.status_code == 200, response.data[:1000]
+        assert response.get_json()['traced_current'] > 0
+    finally:
+        assert client.get('/debug/tracemalloc/stop').status_code == 200
+    metrics = client.get('/api/v1/metrics').get_json()['counters']
+    assert metrics.get('memory_peak_requests:update_bar_chart', 0) >= 1
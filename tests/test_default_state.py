@@ -0,0 +1,28 @@
+# STATE OF THE LAYOUT SNAPSHOT
+#-------------------------------------------------------------------
+# Run from the repository root: python -m pytest tests
+# The snapshot of the start page must not contain dash.no_update, also not a copy of it
+# (as returned by a callback result that was pickled between workers).
+import os
+import pickle
+
+os.environ.setdefault('DASHBOARD_ACCESS_LOG', '')
+
+import dash
+from dash._callback import NoUpdate
+
+import main
+
+def test_default_state_has_no_no_update():
+    state = main.default_state(main.DEFAULT_DATASET)
+    values = [value for props in state.values() for value in props.values()]
+    assert not any(isinstance(value, NoUpdate) for value in values)
+    assert state['wrong_time_alert']['children'] == []
+
+def test_fill_layout_skips_no_update():
+    layout = main.app.layout
+    copy = pickle.loads(pickle.dumps(dash.no_update))
+    assert copy is not dash.no_update
+    before = layout['wrong_time_alert'].children
+    main.fill_layout(layout, {'wrong_time_alert': {'children': copy}})
+    assert layout['wrong_time_alert'].children is before
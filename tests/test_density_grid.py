@@ -0,0 +1,63 @@
+# BINS OF THE DENSITY HEATMAP (aufgabenblätter/_04_Aufgabe_8b.py)
+#-------------------------------------------------------------------
+# Run from the repository root: python -m pytest tests (needs scikit-learn for make_blobs)
+# DensityGrid.histogram must give the same bins as np.histogram2d over the viewport
+# (nbins bins from its first to its last coordinate) and about the same counts.
+import importlib.util
+
+import numpy as np
+import pytest
+
+pytest.importorskip('sklearn')
+
+@pytest.fixture(scope='module')
+def module():
+    spec = importlib.util.spec_from_file_location('aufgabe_8b', 'aufgabenblätter/_04_Aufgabe_8b.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def exact_histogram(module, rect, nbins):
+    x, y, codes = module.grid_index.x, module.grid_index.y, module.cluster_code
+    x_min, x_max, y_min, y_max = rect
+    return [np.histogram2d(y[codes == k], x[codes == k], bins=nbins, range=[[y_min, y_max], [x_min, x_max]])
+            for k in range(len(module.CLUSTERS))]
+
+@pytest.mark.parametrize('nbins', [5, 17, 40, 95])
+def test_bins_match_histogram2d(module, nbins):
+    rect = module.viewport(None)
+    counts, x_edges, y_edges = module.density_grid.histogram(rect, nbins)
+    exact = exact_histogram(module, rect, nbins)
+    assert counts.shape == (len(module.CLUSTERS), nbins, nbins)
+    np.testing.assert_allclose(x_edges, exact[0][2])
+    np.testing.assert_allclose(y_edges, exact[0][1])
+    # the whole data: every point is counted once, only the points of the cells cut by a bin edge
+    # (nbins of the rows and columns of cells) are spread over two bins
+    assert counts.sum() == pytest.approx(len(module.cluster_df))
+    exact = np.stack([h[0] for h in exact])
+    assert np.abs(counts - exact).sum() <= 2 * nbins / module.density_grid.cells * exact.sum()
+
+def test_counts_of_zoomed_viewports(module):
+    rng = np.random.default_rng(0)
+    x, y = module.grid_index.x, module.grid_index.y
+    for _ in range(20):
+        xs, ys = np.sort(rng.uniform(x.min(), x.max(), 2)), np.sort(rng.uniform(y.min(), y.max(), 2))
+        rect = (xs[0], xs[1], ys[0], ys[1])
+        nbins = int(rng.integers(5, 20))
+        histogram = module.density_grid.histogram(rect, nbins)
+        if histogram is None:
+            # narrower than nbins cells of the grid
+            assert (xs[1] - xs[0]) / module.density_grid.width < nbins or (ys[1] - ys[0]) / module.density_grid.height < nbins
+            continue
+        counts, x_edges, y_edges = histogram
+        exact = np.stack([h[0] for h in exact_histogram(module, rect, nbins)])
+        np.testing.assert_allclose(x_edges[[0, -1]], xs)
+        np.testing.assert_allclose(y_edges[[0, -1]], ys)
+        # the points of the cells cut by the border of the viewport are estimated
+        assert abs(counts.sum() - exact.sum()) <= 0.01 * exact.sum() + 2
+
+def test_no_color_uses_the_default_scale(module):
+    # the color dropdown was clearable, px used the template's scale for None
+    figure = module.density_figure(*module.density(None, 10), None, 'Yes')
+    assert figure.layout.coloraxis.colorscale == tuple(tuple(step) for step in module.colorscale(None))
+    assert module.colorscale('Viridis') == module.get_colorscale('Viridis')
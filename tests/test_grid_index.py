@@ -0,0 +1,35 @@
+# ZOOM SELECTION OF THE CLUSTER EXERCISE (aufgabenblätter/_04_Aufgabe_8b.py)
+#-------------------------------------------------------------------
+# Run from the repository root: python -m pytest tests (needs scikit-learn for make_blobs)
+# GridIndex.select and GridIndex.count give the points and counts of a full scan
+# for 2000 random rectangles, also ones reaching beyond the data or open on one axis.
+import importlib.util
+
+import numpy as np
+import pytest
+
+pytest.importorskip('sklearn')
+
+@pytest.fixture(scope='module')
+def module():
+    spec = importlib.util.spec_from_file_location('aufgabe_8b', 'aufgabenblätter/_04_Aufgabe_8b.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_rectangles_match_a_full_scan(module):
+    df, index = module.cluster_df, module.grid_index
+    rng = np.random.default_rng(0)
+    for k in range(2000):
+        xs = np.sort(rng.uniform(df.X.min() - 2, df.X.max() + 2, 2))
+        ys = np.sort(rng.uniform(df.Y.min() - 2, df.Y.max() + 2, 2))
+        rect = (xs[0], xs[1], ys[0], ys[1])
+        if k % 7 == 0:
+            rect = (-np.inf, np.inf, ys[0], ys[1])
+        if k % 11 == 0:
+            rect = (xs[0], xs[1], -np.inf, np.inf)
+        x_min, x_max, y_min, y_max = rect
+        expected = np.flatnonzero((df.X >= x_min) & (df.X <= x_max) & (df.Y >= y_min) & (df.Y <= y_max))
+        np.testing.assert_array_equal(index.select(rect), expected)
+        counts = {cluster: number for cluster, number in index.count(rect).items() if number}
+        assert counts == df.cluster.iloc[expected].value_counts().to_dict()
@@ -0,0 +1,54 @@
+# MEMORY BUDGET OF DATASETS AND CACHES
+#-------------------------------------------------------------------
+# Run from the repository root: python -m pytest tests
+# Datasets and the entries of the result and selection caches share one byte budget,
+# the least recently used of them are dropped first.
+import os
+from types import SimpleNamespace
+
+os.environ.setdefault('DASHBOARD_ACCESS_LOG', '')
+
+import numpy as np
+
+import main
+
+def registry(budget):
+    results, selections = main.ResultCache(maxsize=100), main.ResultCache(maxsize=100)
+    load = lambda name, source: SimpleNamespace(name=name, version=name, nbytes=int(source))
+    def drop(dataset):
+        for cache in (results, selections):
+            cache.discard(dataset.version)
+    return main.DatasetRegistry({'a': 4000, 'b': 4000}, load, budget, on_evict=drop,
+                                caches=(results, selections)), results, selections
+
+def test_cache_entries_count_against_the_budget():
+    datasets, results, selections = registry(10_000)
+    datasets.get('a')
+    selections.put(('a', 'state 1'), (np.zeros(500, dtype=np.int64), np.zeros(5)))
+    selections.put(('a', 'state 2'), (np.zeros(500, dtype=np.int64), np.zeros(5)))
+    # 4000 + 2 * 4040 > 10000: the oldest selection goes
+    assert selections.bytes == 4040
+    assert datasets.total_bytes() <= 10_000
+    found, _ = selections.get(('a', 'state 1'))
+    assert not found and selections.get(('a', 'state 2'))[0]
+
+def test_least_recently_used_first():
+    datasets, results, selections = registry(10_000)
+    datasets.get('a')
+    results.put(('a', 'old'), np.zeros(100))
+    datasets.get('b')
+    results.put(('b', 'new'), np.zeros(100))
+    datasets.get('b')
+    # a and its result are older than b and its result: a goes, with its cached results
+    results.put(('b', 'big'), np.zeros(200))
+    assert list(datasets.loaded) == ['b']
+    assert not results.get(('a', 'old'))[0]
+    assert results.get(('b', 'new'))[0] and results.get(('b', 'big'))[0]
+    assert datasets.total_bytes() <= 10_000
+
+def test_last_dataset_stays():
+    datasets, results, selections = registry(3000)
+    datasets.get('a')
+    results.put(('a', 'result'), np.zeros(10))
+    # the dataset alone is over the budget, only the cache entry is dropped
+    assert list(datasets.loaded) == ['a'] and results.bytes == 0
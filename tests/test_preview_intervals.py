@@ -0,0 +1,59 @@
+# COVERAGE OF THE PREVIEW INTERVALS
+#-------------------------------------------------------------------
+# Run from the repository root: python -m pytest tests
+# The exact sales of random selections of a synthetic dataset (1 million games) have to lie
+# within the approximate 95% interval of their preview (estimate_errors) in about 95% of the
+# selections: on average over the regions, no region below 90%.
+import os
+
+os.environ.setdefault('DASHBOARD_ACCESS_LOG', '')
+
+import numpy as np
+import pytest
+
+import main
+
+ROWS = 1_000_000
+SELECTIONS = 300
+
+@pytest.fixture(scope='module')
+def dataset():
+    frame = main.synthetic_dataset(main.datasets.get(main.DEFAULT_DATASET).df, ROWS)
+    return main.Dataset('coverage', frame, 'coverage', main.SAMPLE_FRACTION)
+
+def random_selections(data, count, seed=1):
+    # year windows and one or two dropdowns with values among the 15 most frequent ones
+    rng = np.random.default_rng(seed)
+    while count:
+        first = int(rng.integers(1980, 2016))
+        year = [first, int(rng.integers(first, 2021))]
+        filters = {}
+        for column in rng.choice(main.FILTERS, rng.integers(1, 3), replace=False):
+            values = data.df[column].value_counts().index[:15]
+            filters[column] = list(rng.choice(values, rng.integers(1, 4), replace=False))
+        exact = data.store.sales(data.store.select(year, filters))
+        if exact[-1] > 0:
+            count -= 1
+            yield year, filters, exact
+
+def test_intervals_cover_the_exact_sales(dataset):
+    covered, intervals = np.zeros(len(main.REGIONS) + 1), 0
+    for year, filters, exact in random_selections(dataset, SELECTIONS):
+        sample_time, dff = main.preview_selection(dataset, year, filters)
+        errors = main.estimate_errors(sample_time, dff.index)
+        if np.isnan(errors).all():
+            continue
+        intervals += 1
+        covered += np.abs(main.region_sales(dff) - exact) <= errors
+
+    # selections without an interval are rare
+    assert intervals >= 0.95 * SELECTIONS
+    coverage = dict(zip(main.REGIONS + ['Global'], covered / intervals))
+    assert np.mean(list(coverage.values())) >= 0.94, coverage
+    assert min(coverage.values()) >= 0.9, coverage
+
+def test_no_interval_without_sampled_rows(dataset):
+    sample_time, dff = main.preview_selection(dataset, [1980, 2020], {'Publisher': ['no such publisher']})
+    assert len(dff) == 0
+    assert np.isnan(main.estimate_errors(sample_time, dff.index)).all()
+    assert main.calculate_global_share({'Global': 0.0}, {'Global': float('nan')}) == 'Global: 0.0% ± ?% (preview)'
@@ -0,0 +1,32 @@
+# PUBLISHER SEARCH
+#-------------------------------------------------------------------
+# Run from the repository root: python -m pytest tests
+# The options are the publishers the other filters leave that contain the search term,
+# prefix matches first, at most SEARCH_LIMIT of them.
+import os
+
+os.environ.setdefault('DASHBOARD_ACCESS_LOG', '')
+
+import pytest
+
+import main
+
+def expected_options(data, year, platform, term):
+    # brute force: the publishers of the selection, prefix matches before substring matches
+    df = data.df[data.df['Year'].between(*year)]
+    if platform:
+        df = df[df['Platform'].isin(platform)]
+    publishers = set(df['Publisher'])
+    values = [value for value in data.publisher_index['values'] if value in publishers]
+    prefix = [value for value in values if value.lower().startswith(term)]
+    contains = [value for value in values if term in value.lower() and not value.lower().startswith(term)]
+    return (prefix + contains)[:main.SEARCH_LIMIT]
+
+@pytest.mark.parametrize('platform', [['NES'], ['GB'], ['PS'], []])
+@pytest.mark.parametrize('term', ['m', 'a', 'ent', 'x'])
+def test_search_within_the_other_filters(platform, term):
+    dataset = main.DEFAULT_DATASET
+    data = main.datasets.get(dataset)
+    year = main.year_range(dataset)
+    options = main.compute_publisher_options(dataset, platform, [], [], [], year, term, [])
+    assert [option['value'] for option in options] == expected_options(data, year, platform, term)
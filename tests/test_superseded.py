@@ -0,0 +1,54 @@
+# SUPERSEDED REQUESTS
+#-------------------------------------------------------------------
+# Run from the repository root: python -m pytest tests
+# A request of a page that is still computing when a newer request of the same page for the
+# same callback was answered (also from the cache) gives no update (PreventUpdate, 204).
+import os
+import threading
+
+os.environ.setdefault('DASHBOARD_ACCESS_LOG', '')
+
+from dash.exceptions import PreventUpdate
+
+import main
+
+started, release = threading.Event(), threading.Event()
+
+@main.cached_callback
+def slow_panel(dataset, state):
+    if state == 'A':
+        started.set()
+        release.wait(10)
+    return state
+
+def page_request(page):
+    return main.server.test_request_context('/_dash-update-component', method='POST',
+                                            json={'state': [{'id': 'page_id', 'property': 'data', 'value': page}]})
+
+def run_in_page(page, state, results):
+    with page_request(page):
+        try:
+            results[state] = slow_panel(main.DEFAULT_DATASET, state)
+        except PreventUpdate:
+            results[state] = 'prevented'
+
+def test_late_result_after_a_cache_hit_is_dropped():
+    # B is in the cache, A is computing when the page asks for B
+    slow_panel(main.DEFAULT_DATASET, 'B')
+    results = {}
+    first = threading.Thread(target=run_in_page, args=('page-1', 'A', results))
+    first.start()
+    assert started.wait(10)
+    # another page asking for A at the same time is not affected (single flight shares the result)
+    other_results = {}
+    other = threading.Thread(target=run_in_page, args=('page-2', 'A', other_results))
+    other.start()
+    run_in_page('page-1', 'B', results)
+    release.set()
+    first.join()
+    other.join()
+    assert results == {'A': 'prevented', 'B': 'B'}
+    assert other_results == {'A': 'A'}
+    # the result of A is cached for the next request
+    with page_request('page-1'):
+        assert slow_panel(main.DEFAULT_DATASET, 'A') == 'A'